@@ -1,9 +1,11 @@
 from zyndai_agent.agent import AgentConfig, ZyndAIAgent
 from zyndai_agent.message import AgentMessage
+from zyndai_agent.llm import run_llm_with_budget
 from dotenv import load_dotenv
 from pathlib import Path
 import os, time, json
 from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     from openai import OpenAI as _OpenAI
@@ -17,6 +19,9 @@ load_dotenv(dotenv_path=env_path)
 port = int(os.environ.get("PORT", 5005))
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 _llm = _OpenAI(api_key=OPENAI_API_KEY) if (_openai_available and OPENAI_API_KEY) else None
+_llm_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("LLM_WORKERS", 8)), thread_name_prefix="llm")
+# Longest the submit response waits for LLM guidance (override per request with llm_budget_ms).
+APPLY_LLM_BUDGET_MS = int(os.environ.get("APPLY_LLM_BUDGET_MS", 8000))
 SUPABASE_URL = os.environ.get("SUPABASE_URL") or os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY")
 
@@ -154,6 +159,11 @@ def message_handler(message: AgentMessage, topic: str):
         # Save application
         scheme_id   = payload.get("scheme_id", "unknown")
         scheme_name = payload.get("scheme_name", "Unknown Scheme")
+        try:
+            llm_budget = int(payload.get("llm_budget_ms", APPLY_LLM_BUDGET_MS))
+        except (TypeError, ValueError):
+            agent.set_response(message.message_id, json.dumps({"error": "llm_budget_ms must be an integer"}))
+            return
         saved       = save_application(payload)
         app_id      = saved["id"] if saved else f"APP-{abs(hash(scheme_id + str(time.time())))}"[:16]
         required    = get_required_docs(scheme_id, payload.get("category", "general"))
@@ -166,7 +176,11 @@ def message_handler(message: AgentMessage, topic: str):
 
         # ── LLM: personalized application guidance ────────────────────────
         citizen  = payload.get("citizen", {})
-        llm_info = llm_application_guidance(citizen, scheme_id, scheme_name, required)
+        llm_info, llm_status = run_llm_with_budget(
+            _llm, _llm_pool, llm_application_guidance, citizen, scheme_id, scheme_name, required,
+            budget_ms=llm_budget,
+        )
+        llm_info = llm_info or {}
 
         agent.set_response(message.message_id, json.dumps({
             "application_id":   str(app_id),
@@ -181,6 +195,7 @@ def message_handler(message: AgentMessage, topic: str):
             "llm_guidance":     llm_info.get("guidance", ""),
             "llm_warning":      llm_info.get("warning", ""),
             "llm_priority_doc": llm_info.get("priority_doc", ""),
+            "enrichments":      {"llm_guidance": llm_status},
         }))
 
     else:
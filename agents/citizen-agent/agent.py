@@ -2,8 +2,9 @@ from zyndai_agent.agent import AgentConfig, ZyndAIAgent
 from zyndai_agent.message import AgentMessage
 from dotenv import load_dotenv
 from pathlib import Path
-import os, time, json
-import requests
+import os, io, csv, time, json, threading, asyncio
+import httpx
+from collections import OrderedDict, deque
 
 env_path = Path(__file__).resolve().parent.parent.parent / "agents" / ".env"
 load_dotenv(dotenv_path=env_path, override=False)
@@ -13,11 +14,48 @@ port = int(os.environ.get("PORT", 5000))
 
 # On Railway: set these to the public Railway service URLs.
 # Locally: defaults to localhost ports.
+# A comma-separated list declares replicas of the same agent, which enables hedging.
 POLICY_AGENT_URL      = os.environ.get("POLICY_AGENT_URL",      "http://localhost:5001")
 ELIGIBILITY_AGENT_URL = os.environ.get("ELIGIBILITY_AGENT_URL", "http://localhost:5002")
 MATCHER_AGENT_URL     = os.environ.get("MATCHER_AGENT_URL",     "http://localhost:5003")
 CREDENTIAL_AGENT_URL  = os.environ.get("CREDENTIAL_AGENT_URL",  "http://localhost:5004")
 
+# Sub-agent HTTP client: one pooled connection set shared by every pipeline.
+SUBAGENT_MAX_CONNECTIONS = int(os.environ.get("SUBAGENT_MAX_CONNECTIONS", 20))
+SUBAGENT_RETRIES         = int(os.environ.get("SUBAGENT_RETRIES", 2))
+SUBAGENT_RETRY_BACKOFF   = float(os.environ.get("SUBAGENT_RETRY_BACKOFF", 0.2))
+
+# Hedged requests to replicated sub-agents: if the first replica has not
+# answered by the given latency percentile, the call is duplicated to another
+# replica and the first answer wins. HEDGE_MAX_RATE caps the share of calls
+# that may be hedged (0 disables hedging).
+HEDGE_PERCENTILE   = float(os.environ.get("HEDGE_PERCENTILE", 95))
+HEDGE_MAX_RATE     = float(os.environ.get("HEDGE_MAX_RATE", 0.1))
+HEDGE_MIN_DELAY_MS = int(os.environ.get("HEDGE_MIN_DELAY_MS", 50))
+HEDGE_MIN_SAMPLES  = int(os.environ.get("HEDGE_MIN_SAMPLES", 20))
+HEDGE_WINDOW       = int(os.environ.get("HEDGE_WINDOW", 200))
+
+# Result cache for the deterministic + LLM part of the pipeline (0 disables it).
+PIPELINE_CACHE_SIZE = int(os.environ.get("PIPELINE_CACHE_SIZE", 1024))
+PIPELINE_CACHE_TTL  = float(os.environ.get("PIPELINE_CACHE_TTL", 900))
+# Per-request latency budget. LLM enrichments that would overrun it are
+# skipped or dropped; eligibility, ranking and the VC are always returned.
+PIPELINE_BUDGET_MS     = int(os.environ.get("PIPELINE_BUDGET_MS", 4000))
+LLM_RESPONSE_MARGIN_MS = int(os.environ.get("LLM_RESPONSE_MARGIN_MS", 250))
+# How long a catalog version reported by the Policy Agent is trusted before re-checking.
+CATALOG_VERSION_TTL = float(os.environ.get("CATALOG_VERSION_TTL", 30))
+# Nearest missed schemes (by distance to eligibility) ranked when a citizen has no exact match.
+PARTIAL_MATCH_LIMIT = 6
+# Eligibility explanations come from the Eligibility Agent's templates;
+# EXPLANATION_LLM=1 asks for LLM text on top, within the budget.
+EXPLANATION_LLM = os.environ.get("EXPLANATION_LLM", "0") == "1"
+# Longest a streamed explanation request waits for the LLM text.
+EXPLANATION_PUSH_WAIT_MS = int(os.environ.get("EXPLANATION_PUSH_WAIT_MS", 30000))
+
+# Bulk evaluation: profiles per Eligibility Agent call, and batches in flight at once.
+BULK_BATCH_SIZE  = int(os.environ.get("BULK_BATCH_SIZE", 500))
+BULK_CONCURRENCY = int(os.environ.get("BULK_CONCURRENCY", 2))
+
 config = AgentConfig(
     name="Citizen Agent",
     description="Orchestrates the full policy-eligibility pipeline with partial match fallback",
@@ -34,12 +72,37 @@ print(f"  Matcher Agent     → {MATCHER_AGENT_URL}")
 print(f"  Credential Agent  → {CREDENTIAL_AGENT_URL}")
 
 
-def call_sub_agent(base_url: str, data: dict, timeout: int = 25) -> any:
-    """
-    Call a sub-agent with a sequence of fallbacks.
+# All sub-agent I/O runs on one event loop in a background thread. Handler
+# threads submit coroutines to it, so concurrent pipelines share a handful of
+# pooled connections (multiplexed over HTTP/2 where the agent URL is https)
+# instead of holding one blocked thread and one socket per call.
+_loop = asyncio.new_event_loop()
+threading.Thread(target=_loop.run_forever, daemon=True, name="citizen-agent-loop").start()
+
+
+async def _make_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=SUBAGENT_MAX_CONNECTIONS, max_keepalive_connections=SUBAGENT_MAX_CONNECTIONS),
+    )
+
+_client = asyncio.run_coroutine_threadsafe(_make_client(), _loop).result()
+
+
+def run_on_loop(coro, timeout: float | None = None):
+    """Run a coroutine on the orchestrator loop from a handler thread and wait for it."""
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result(timeout)
 
-    Order of attempts:
-    1. `base_url` supplied by the caller (module-level var)
+
+def _split_urls(value: str) -> list:
+    return [u.strip().rstrip("/") for u in (value or "").split(",") if u.strip()]
+
+
+def _candidate_urls(base_url: str) -> list:
+    """
+    Sub-agent base URLs to try, in order:
+    1. `base_url` supplied by the caller (module-level var), every replica if
+       it lists several
     2. Environment variable override for the same role (if present)
        - e.g. if base_url contains '5001' this will look for `POLICY_AGENT_URL` etc.
     3. Localhost default for the expected port (127.0.0.1:PORT)
@@ -50,8 +113,7 @@ def call_sub_agent(base_url: str, data: dict, timeout: int = 25) -> any:
     attempts = []
 
     # canonical first attempt (from caller)
-    if base_url:
-        attempts.append(base_url.rstrip("/"))
+    attempts.extend(_split_urls(base_url))
 
     # attempt to use any matching env var for the same agent role
     # discover role name by scanning common env var names
@@ -65,9 +127,7 @@ def call_sub_agent(base_url: str, data: dict, timeout: int = 25) -> any:
         "FORM16_PREMIUM_AGENT_URL",
     ]
     for name in role_env_candidates:
-        val = os.environ.get(name)
-        if val:
-            val = val.rstrip("/")
+        for val in _split_urls(os.environ.get(name)):
             if val not in attempts:
                 attempts.append(val)
 
@@ -76,36 +136,270 @@ def call_sub_agent(base_url: str, data: dict, timeout: int = 25) -> any:
         candidate = f"http://127.0.0.1:{p}"
         if candidate not in attempts:
             attempts.append(candidate)
+    return attempts
 
-    # Try each candidate URL until one succeeds
-    last_err = None
-    for base in attempts:
-        url = base + "/webhook/sync"
+
+def _is_retryable(exc: Exception, retry_timeouts: bool = True) -> bool:
+    """
+    Transient failures worth another attempt. Without `retry_timeouts`, a
+    timeout or 504 is final: for expensive, non-idempotent calls (a bulk
+    batch with LLM text) the agent may still be working on the first one.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in ((502, 503, 504) if retry_timeouts else (502, 503))
+    if isinstance(exc, httpx.TimeoutException):
+        return retry_timeouts
+    return isinstance(exc, (httpx.RemoteProtocolError, httpx.ReadError))
+
+
+# Hedging state. Only touched from the event loop thread, so no locking.
+_latencies    = {}  # replica set -> recent successful call latencies (ms)
+_hedge_window = deque(maxlen=HEDGE_WINDOW)  # 1 per recent replicated call that was hedged, else 0
+_hedge_stats  = {"calls": 0, "hedged": 0, "hedge_wins": 0, "capped": 0}
+
+
+def _hedge_delay(replica_set: str) -> float | None:
+    """Seconds to wait before hedging: the configured percentile of recent latencies."""
+    samples = _latencies.get(replica_set)
+    if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(len(ordered) * HEDGE_PERCENTILE / 100))
+    return max(ordered[idx], HEDGE_MIN_DELAY_MS) / 1000
+
+
+async def hedge_stats() -> dict:
+    """Hedging counters; a coroutine so it reads the state on the loop thread."""
+    calls = _hedge_stats["calls"]
+    return {
+        **_hedge_stats,
+        "hedge_rate": round(_hedge_stats["hedged"] / calls, 4) if calls else 0.0,
+        "max_rate": HEDGE_MAX_RATE,
+        "delay_ms": {k: round(d * 1000) for k in _latencies if (d := _hedge_delay(k)) is not None},
+    }
+
+
+async def _post(url: str, body: dict, timeout: float) -> any:
+    resp = await _client.post(url, json=body, timeout=timeout)
+    resp.raise_for_status()
+    response = resp.json().get("response", {})
+    if isinstance(response, str):
         try:
-            print(f"  [Citizen Agent] Trying sub-agent at {url}")
-            resp = requests.post(url, json={"prompt": json.dumps(data), "sender_id": agent.agent_id, "message_type": "query", "metadata": data}, timeout=timeout)
-            resp.raise_for_status()
-            result = resp.json()
-            response = result.get("response", {})
-            if isinstance(response, str):
-                try:
-                    return json.loads(response)
-                except json.JSONDecodeError:
-                    return response
+            return json.loads(response)
+        except json.JSONDecodeError:
             return response
-        except requests.exceptions.ConnectionError as ce:
-            print(f"  [!] ConnectionError at {url}: {ce}")
-            last_err = ce
-            continue
-        except Exception as exc:
-            print(f"  [!] Sub-agent call failed at {url}: {exc}")
-            last_err = exc
-            continue
+    return response
+
+
+async def _post_hedged(url: str, backup_url: str, replica_set: str, body: dict, timeout: float) -> any:
+    """
+    POST to `url`; if it is slower than the hedge delay, also POST to
+    `backup_url` and return whichever succeeds first, cancelling the other.
+    """
+    started = time.perf_counter()
+    primary = asyncio.ensure_future(_post(url, body, timeout))
+    backup = None
+    delay = _hedge_delay(replica_set)
+    _hedge_stats["calls"] += 1
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=min(delay, timeout) if delay is not None else None)
+        if done or delay is None:
+            _hedge_window.append(0)
+            return await primary
+        if sum(_hedge_window) >= HEDGE_MAX_RATE * max(len(_hedge_window), 1):
+            _hedge_stats["capped"] += 1
+            _hedge_window.append(0)
+            return await primary
+
+        _hedge_window.append(1)
+        _hedge_stats["hedged"] += 1
+        print(f"  [hedge] {url} slower than {round(delay * 1000)}ms — hedging to {backup_url}")
+        backup = asyncio.ensure_future(_post(backup_url, body, max(0.0, timeout - delay)))
+        pending = {primary, backup}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is backup:
+                        _hedge_stats["hedge_wins"] += 1
+                    return task.result()
+        return await primary  # both failed: surface the primary's error
+    finally:
+        if any(t is not None and t.done() and not t.cancelled() and t.exception() is None for t in (primary, backup)):
+            _latencies.setdefault(replica_set, deque(maxlen=HEDGE_WINDOW)).append((time.perf_counter() - started) * 1000)
+        for task in (primary, backup):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+async def call_sub_agent_async(base_url: str, data: dict, timeout: float = 25, retries: int = SUBAGENT_RETRIES,
+                               retry_timeouts: bool = True) -> any:
+    """
+    Call a sub-agent with a per-call deadline, retries and URL fallbacks.
+
+    `timeout` is the deadline for the whole call, not per attempt. Transient
+    failures (timeouts, dropped connections, 502/503/504) are retried on the
+    same URL with exponential backoff while the deadline allows (timeouts
+    and 504s only with `retry_timeouts`, see `_is_retryable`); a refused
+    connection or other error moves on to the next candidate URL.
+
+    When `base_url` lists several replicas, a slow attempt is hedged to the
+    next replica (see `_post_hedged`).
+    """
+    deadline = time.monotonic() + timeout
+    body = {"prompt": json.dumps(data), "sender_id": agent.agent_id, "message_type": "query", "metadata": data}
+    replicas = _split_urls(base_url)
+    hedging = len(replicas) > 1 and HEDGE_MAX_RATE > 0
+
+    last_err = None
+    for base in _candidate_urls(base_url):
+        url = base + "/webhook/sync"
+        backup = None
+        if hedging and base in replicas:
+            backup = replicas[(replicas.index(base) + 1) % len(replicas)] + "/webhook/sync"
+        for attempt in range(retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return {"error": f"Sub-agent deadline of {timeout}s exceeded (last error: {str(last_err)})"}
+            try:
+                print(f"  [Citizen Agent] Trying sub-agent at {url}" + (f" (retry {attempt})" if attempt else ""))
+                if backup:
+                    return await _post_hedged(url, backup, base_url, body, remaining)
+                return await _post(url, body, remaining)
+            except httpx.ConnectError as ce:
+                print(f"  [!] ConnectionError at {url}: {ce}")
+                last_err = ce
+                break
+            except Exception as exc:
+                print(f"  [!] Sub-agent call failed at {url}: {exc!r}")
+                last_err = exc
+                if not _is_retryable(exc, retry_timeouts) or attempt == retries:
+                    break
+                await asyncio.sleep(min(SUBAGENT_RETRY_BACKOFF * (2 ** attempt), max(0.0, deadline - time.monotonic())))
 
     # If nothing worked, return a structured error
     return {"error": f"All sub-agent endpoints unreachable (last error: {str(last_err)})"}
 
 
+def call_sub_agent(base_url: str, data: dict, timeout: float = 25) -> any:
+    """Blocking wrapper around `call_sub_agent_async` for handler threads."""
+    return run_on_loop(call_sub_agent_async(base_url, data, timeout))
+
+
+class PipelineCache:
+    """
+    LRU + TTL cache of pipeline results keyed by a normalized citizen profile.
+
+    Entries belong to one catalog version; when the Policy Agent reports a new
+    version the whole cache is dropped, since any scheme change can alter
+    eligibility, ranking and LLM text.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def set_version(self, version: str) -> None:
+        with self._lock:
+            if version == self.version:
+                return
+            if self.version is not None:
+                self._stats["invalidations"] += 1
+                print(f"  [Cache] Catalog version {self.version} → {version}, dropping {len(self._entries)} entries")
+            self._entries.clear()
+            self.version = version
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def put(self, key: tuple, version: str, value) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if version != self.version:
+                return  # catalog changed while this pipeline was running
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size":           len(self._entries),
+                "max_entries":    self.max_entries,
+                "ttl_seconds":    self.ttl,
+                "hit_rate":       round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+                "catalog_version": self.version,
+            }
+
+
+pipeline_cache = PipelineCache(PIPELINE_CACHE_SIZE, PIPELINE_CACHE_TTL)
+
+# Single-flight registry: (profile key, catalog version) -> step tasks of the
+# pipeline currently computing it. Only touched from the event loop thread.
+SHARED_STEPS  = ("policy_fetch", "eligibility_check", "eligibility_explanation", "scheme_ranking")
+_in_flight    = {}
+_flight_stats = {"leaders": 0, "coalesced": 0}
+_catalog_version = {"version": None, "count": 0, "checked_at": 0.0}
+
+
+async def current_catalog_version() -> str | None:
+    """Catalog version from the Policy Agent, re-checked at most every CATALOG_VERSION_TTL seconds."""
+    if time.monotonic() - _catalog_version["checked_at"] < CATALOG_VERSION_TTL:
+        return _catalog_version["version"]
+    raw = await call_sub_agent_async(POLICY_AGENT_URL, {"request": "catalog_version", "if_none_match": _catalog_version["version"]})
+    version = raw.get("version") if isinstance(raw, dict) else None
+    if version:
+        # "not_modified" replies carry no count; keep the one we have
+        _catalog_version.update(version=version, count=raw.get("count", _catalog_version["count"]), checked_at=time.monotonic())
+        pipeline_cache.set_version(version)
+    return version
+
+
+# Profile fields that never affect eligibility. Every other field may be read
+# by a scheme's `where` conditions (gender, land_ha, documents, ...), so it
+# is part of the cache key.
+PROFILE_IDENTITY_FIELDS = {"name", "full_name", "email", "phone", "id", "citizen_id", "did",
+                           "verified", "verified_at", "created_at", "budget_ms"}
+
+
+def profile_cache_key(citizen: dict) -> tuple | None:
+    """Normalize the fields eligibility depends on; None if the profile is unusable."""
+    try:
+        age    = int(float(citizen.get("age", 0)))
+        income = int(float(citizen.get("income", 0)))
+    except (TypeError, ValueError):
+        return None
+    category = str(citizen.get("category", "general")).lower()  # same normalization as the rule engine
+    state    = str(citizen.get("state") or "").strip().lower()
+    extra = tuple(sorted(
+        (k, json.dumps(v, sort_keys=True, default=str)) for k, v in citizen.items()
+        if k not in PROFILE_IDENTITY_FIELDS and k not in ("age", "income", "category", "state")
+    ))
+    return (age, income, category, state, extra)
+
+
 def extract_citizen_profile(content: any) -> dict:
     if isinstance(content, str):
         try:
@@ -126,64 +420,322 @@ def extract_citizen_profile(content: any) -> dict:
     return {}
 
 
-def message_handler(message: AgentMessage, topic: str):
-    print("\n" + "=" * 52)
-    print("[Citizen Agent] New request received")
+async def run_pipeline_dag(steps: dict, seed: dict | None = None, shared: dict | None = None, publish: dict | None = None) -> tuple:
+    """
+    Run pipeline steps as a small dependency graph.
 
-    citizen = extract_citizen_profile(message.content)
-    print(f"  Profile: {citizen}")
+    `steps` maps a step name to `(depends_on, fn)`. `fn` is a coroutine
+    function that receives a dict with the results of its dependencies and
+    returns `(value, report)`, where `report` is merged into that step's
+    `pipeline` entry. Every step is its own task that starts as soon as all of
+    its dependencies have finished, so independent steps overlap and total
+    latency follows the critical path.
 
-    pipeline = []
-
-    # Step 1 — Fetch all schemes
-    print("  [1/4] Fetching schemes from Policy Agent...")
-    raw_schemes = call_sub_agent(POLICY_AGENT_URL, {"request": "get_all_schemes"})
-    schemes = raw_schemes if isinstance(raw_schemes, list) else raw_schemes.get("schemes", [])
-    pipeline.append({"step": "policy_fetch", "count": len(schemes), "ok": bool(schemes)})
-    print(f"        Got {len(schemes)} schemes")
-
-    # Step 2 — Evaluate eligibility (returns ALL schemes with eligible flag)
-    print("  [2/4] Checking eligibility...")
-    raw_all = call_sub_agent(ELIGIBILITY_AGENT_URL, {"citizen": citizen, "schemes": schemes, "return_all": True})
-    # Handle both new shape {all_evaluated, llm_summary, llm_advice} and legacy plain list
-    if isinstance(raw_all, dict):
-        all_evaluated = raw_all.get("all_evaluated", [])
-        llm_summary   = raw_all.get("llm_summary", "")
-        llm_advice    = raw_all.get("llm_advice", "")
-    else:
-        all_evaluated = raw_all if isinstance(raw_all, list) else []
-        llm_summary   = ""
-        llm_advice    = ""
-    eligible_schemes  = [s for s in all_evaluated if s.get("eligible")]
-    partial_schemes   = sorted([s for s in all_evaluated if not s.get("eligible")], key=lambda x: x.get("match_score", 0), reverse=True)
-    pipeline.append({"step": "eligibility_check", "count": len(eligible_schemes), "ok": True})
-    print(f"        Eligible: {len(eligible_schemes)}, Partial: {len(partial_schemes)}")
-
-    # Decide what to rank: eligible first; if none use top partial matches
-    schemes_to_rank = eligible_schemes if eligible_schemes else partial_schemes[:6]
-    using_partial   = len(eligible_schemes) == 0 and bool(partial_schemes)
-
-    # Step 3 — Rank
-    print("  [3/4] Ranking schemes...")
-    raw_ranked = call_sub_agent(MATCHER_AGENT_URL, {"citizen": citizen, "eligible_schemes": schemes_to_rank})
-    ranked_schemes = raw_ranked if isinstance(raw_ranked, list) else raw_ranked.get("ranked", [])
-    pipeline.append({"step": "scheme_ranking", "count": len(ranked_schemes), "ok": bool(ranked_schemes)})
-    print(f"        Ranked: {len(ranked_schemes)}")
-
-    # Step 4 — VC (only if genuinely eligible)
-    vc = None
-    if eligible_schemes:
-        print("  [4/4] Issuing Verifiable Credential...")
-        raw_vc = call_sub_agent(CREDENTIAL_AGENT_URL, {"citizen": citizen, "eligible_schemes": eligible_schemes})
+    `seed` maps step names to already-known `(value, report)` pairs (e.g. from
+    the result cache); those steps are not run and are reported as cached.
+
+    `shared` maps step names to in-flight tasks of an identical pipeline; those
+    steps await that task instead of running again and are reported as
+    coalesced. The tasks of this run are added to `publish` so that later
+    identical pipelines can do the same.
+
+    Returns `(results, pipeline, timing)`.
+    """
+    t0 = time.perf_counter()
+    results, reports, spans = {}, {}, {}
+    tasks = {}
+    shared = shared or {}
+    for name, (value, report) in (seed or {}).items():
+        results[name] = value
+        reports[name] = {**report, "cached": True}
+        spans[name] = (0, 0)
+
+    async def _run(name, deps, fn):
+        if name in shared:
+            started = time.perf_counter()
+            value, report = await asyncio.shield(shared[name])
+            report = {**report, "coalesced": True}
+        else:
+            for d in deps:
+                if d not in results:
+                    await tasks[d]
+            started = time.perf_counter()
+            try:
+                value, report = await fn({d: results[d] for d in deps})
+            except Exception as exc:
+                print(f"  [!] Step {name} failed: {exc!r}")
+                value, report = None, {"count": None, "ok": False, "error": str(exc)}
+        results[name] = value
+        reports[name] = report
+        spans[name] = (round((started - t0) * 1000), round((time.perf_counter() - t0) * 1000))
+        return value, report
+
+    for name, (deps, fn) in steps.items():
+        missing = [d for d in deps if d not in steps]
+        if missing:
+            raise ValueError(f"Step {name} depends on unknown steps: {missing}")
+        if name not in results:
+            tasks[name] = asyncio.ensure_future(_run(name, deps, fn))
+    if publish is not None:
+        publish.update(tasks)
+    await asyncio.gather(*tasks.values())
+
+    total_ms = round((time.perf_counter() - t0) * 1000)
+
+    # Longest chain of step durations through the dependency graph
+    finish = {}
+    for name in sorted(steps, key=lambda n: spans[n][1]):
+        deps = steps[name][0]
+        duration = spans[name][1] - spans[name][0]
+        finish[name] = duration + max((finish[d] for d in deps), default=0)
+    sum_ms = sum(end - start for start, end in spans.values())
+
+    pipeline = [
+        {"step": name, **reports[name], "depends_on": list(deps),
+         "started_ms": spans[name][0], "duration_ms": spans[name][1] - spans[name][0]}
+        for name, (deps, _) in steps.items()
+    ]
+    timing = {
+        "total_ms":         total_ms,
+        "sum_of_steps_ms":  sum_ms,
+        "critical_path_ms": max(finish.values(), default=0),
+        "overlap_ms":       max(0, sum_ms - total_ms),
+    }
+    return results, pipeline, timing
+
+
+def _cacheable(report: dict) -> bool:
+    """Steps worth replaying: freshly run, no errors and no LLM text lost to the budget."""
+    if report.get("cached") or report.get("coalesced") or report.get("error"):
+        return False
+    enrichment = report.get("enrichment")
+    statuses = set(enrichment) if isinstance(enrichment, dict) else {enrichment}
+    return not statuses & {"dropped", "skipped", "pending"}
+
+
+async def with_schemes_by_value(request: dict) -> dict | None:
+    """
+    `request` with its catalog version's schemes sent by value, for when a
+    sub-agent answers "catalog_unavailable" (it could not fetch that
+    snapshot from the Policy Agent itself). None if the Policy Agent cannot
+    supply them either.
+    """
+    snapshot = await call_sub_agent_async(POLICY_AGENT_URL, {"request": "get_snapshot", "version": request.get("catalog_version")})
+    if not isinstance(snapshot, dict) or not snapshot.get("schemes"):
+        return None
+    return {**request, "catalog_version": snapshot.get("version"), "schemes": snapshot["schemes"]}
+
+
+async def fetch_explanation(token: str, wait_ms: int = 0) -> dict:
+    """
+    Status and text of an async explanation from the Eligibility Agent,
+    long-polling up to `wait_ms`. The job lives on whichever replica issued
+    the token, so replicas are asked in turn until one knows it.
+    """
+    job = {"token": token, "status": "unknown"}
+    for url in _split_urls(ELIGIBILITY_AGENT_URL):
+        raw = await call_sub_agent_async(url, {"request": "explanation", "token": token, "wait_ms": wait_ms},
+                                         timeout=wait_ms / 1000 + 5, retries=0)
+        if isinstance(raw, dict) and raw.get("status") not in (None, "unknown"):
+            return raw
+    return job
+
+
+async def run_citizen_pipeline(citizen: dict, budget_ms: int = PIPELINE_BUDGET_MS) -> dict:
+    # Deterministic steps always complete; LLM enrichments only get what is
+    # left of the request budget and are reported as skipped/dropped if not.
+    deadline  = time.monotonic() + budget_ms / 1000
+
+    def llm_budget_ms() -> int:
+        return int((deadline - time.monotonic()) * 1000) - LLM_RESPONSE_MARGIN_MS
+
+    # Sub-agents are sent the catalog version and scheme ids only; each keeps
+    # its own copy of the snapshot for that version.
+    version   = await current_catalog_version()
+    cache_key = profile_cache_key(citizen) if PIPELINE_CACHE_SIZE > 0 else None
+    cached    = (pipeline_cache.get(cache_key) if version and cache_key else None) or {}
+    if cached:
+        print(f"  [cache] Hit — reusing {', '.join(cached)}")
+
+    # Single-flight: an identical profile already in the pipeline shares its
+    # citizen-independent steps with this request instead of recomputing them.
+    flight_key = (cache_key, version) if cache_key and version else None
+    leader     = _in_flight.get(flight_key) if flight_key else None
+    shared     = {name: task for name, task in (leader or {}).items() if name in SHARED_STEPS and name not in cached}
+    publish    = None
+    if shared:
+        _flight_stats["coalesced"] += 1
+        print(f"  [single-flight] Joining in-flight pipeline for {', '.join(shared)}")
+    elif flight_key:
+        publish = _in_flight[flight_key] = {}
+        _flight_stats["leaders"] += 1
+
+    # Step 1 — Resolve the current catalog version
+    async def policy_fetch(_):
+        print(f"  [policy_fetch] Catalog version {version} ({_catalog_version['count']} schemes)")
+        return version, {"count": _catalog_version["count"] if version else 0, "ok": bool(version)}
+
+    # Step 2 — Evaluate eligibility (returns ALL schemes with eligible flag, no LLM)
+    async def eligibility_check(inputs):
+        print("  [eligibility_check] Checking eligibility...")
+        # Only the eligible schemes and the nearest misses come back. Misses
+        # are the counterfactuals: ranked by distance to eligibility, each
+        # with the profile changes that would qualify. The template
+        # explanation comes back with them.
+        request = {
+            "citizen": citizen, "catalog_version": inputs["policy_fetch"], "counterfactual_limit": PARTIAL_MATCH_LIMIT,
+            "explain": "template",
+        }
+        raw_all = await call_sub_agent_async(ELIGIBILITY_AGENT_URL, request)
+        if isinstance(raw_all, dict) and raw_all.get("error") == "catalog_unavailable":
+            print("        Eligibility Agent has no copy of the catalog — sending the schemes by value")
+            by_value = await with_schemes_by_value(request)
+            if by_value:
+                raw_all = await call_sub_agent_async(ELIGIBILITY_AGENT_URL, by_value)
+        if isinstance(raw_all, dict) and "error" in raw_all:
+            return {"eligible": [], "partial": []}, {"count": 0, "ok": False, "error": raw_all["error"]}
+        explanation = {k: raw_all.get(k, "") for k in ("llm_summary", "llm_advice")} if isinstance(raw_all, dict) else {}
+        # Handle the {eligible, partial, ...} shape, the older {all_evaluated, ...} shape and a legacy plain list
+        if isinstance(raw_all, dict) and "eligible" in raw_all:
+            eligible_schemes = raw_all.get("eligible", [])
+            partial_schemes  = raw_all.get("counterfactuals", raw_all.get("partial", []))
+        else:
+            if isinstance(raw_all, dict):
+                all_evaluated = raw_all.get("all_evaluated", [])
+            else:
+                all_evaluated = raw_all if isinstance(raw_all, list) else []
+            eligible_schemes = [s for s in all_evaluated if s.get("eligible")]
+            partial_schemes  = sorted([s for s in all_evaluated if not s.get("eligible")], key=lambda x: x.get("match_score", 0), reverse=True)
+        print(f"        Eligible: {len(eligible_schemes)}, Partial: {len(partial_schemes)}")
+        return {"eligible": eligible_schemes, "partial": partial_schemes, "explanation": explanation}, \
+            {"count": len(eligible_schemes), "ok": True}
+
+    # Step 2b — Explanation of the result
+    # The template text comes back with eligibility_check. With
+    # EXPLANATION_LLM the Eligibility Agent also writes LLM text in the
+    # background behind a token, requested alongside the deterministic steps;
+    # it is waited for only while the budget lasts, after which the client
+    # gets the template text plus the token to fetch the LLM text later.
+    async def eligibility_explanation(inputs):
+        empty = {"llm_summary": "", "llm_advice": ""}
+        if not EXPLANATION_LLM:
+            text = (inputs["eligibility_check"] or {}).get("explanation") or empty
+            return text, {"count": None, "ok": bool(text["llm_summary"]), "enrichment": "template" if text["llm_summary"] else "unavailable"}
+        budget = llm_budget_ms()
+        if budget <= 0:
+            return empty, {"count": None, "ok": False, "enrichment": "skipped"}
+        print(f"  [eligibility_explanation] LLM budget {budget} ms")
+        request = {"citizen": citizen, "catalog_version": inputs["policy_fetch"], "explain_only": True, "explain": "async"}
+        raw = await call_sub_agent_async(ELIGIBILITY_AGENT_URL, request,
+                                         timeout=(budget + LLM_RESPONSE_MARGIN_MS) / 1000, retries=0)
+        if not isinstance(raw, dict) or "error" in raw:
+            return empty, {"count": None, "ok": False, "enrichment": "dropped"}
+        text = {"llm_summary": raw.get("llm_summary", ""), "llm_advice": raw.get("llm_advice", "")}
+        enrichments = raw.get("enrichments", {})
+        token = raw.get("explanation_token")
+        if not token:
+            # A cached LLM answer, or no LLM available (template text)
+            status = "ok" if enrichments.get("explanation") == "llm" else enrichments.get("explanation", "unavailable")
+            return text, {"count": None, "ok": bool(text["llm_summary"]), "enrichment": status}
+        job = await fetch_explanation(token, max(0, llm_budget_ms()))
+        if job.get("status") == "pending":
+            return {**text, "explanation_token": token}, {"count": None, "ok": False, "enrichment": "pending"}
+        if job.get("status") == "ok":
+            text = {"llm_summary": job.get("llm_summary", ""), "llm_advice": job.get("llm_advice", "")}
+        return text, {"count": None, "ok": job.get("status") == "ok", "enrichment": job.get("status", "unavailable")}
+
+    # Step 3 — Rank: eligible first; if none use the nearest misses, which
+    # keep their distance order (the Matcher's relevance breaks ties)
+    async def scheme_ranking(inputs):
+        evaluation = inputs["eligibility_check"]
+        schemes_to_rank = evaluation["eligible"] or evaluation["partial"][:PARTIAL_MATCH_LIMIT]
+        print("  [scheme_ranking] Ranking schemes...")
+        refs = [{"scheme_id": s["scheme_id"], "match_score": s.get("match_score", 0)} for s in schemes_to_rank]
+        raw_ranked = await call_sub_agent_async(MATCHER_AGENT_URL, {
+            "citizen": citizen, "catalog_version": version, "eligible_schemes": refs, "llm_budget_ms": llm_budget_ms(),
+        })
+        if isinstance(raw_ranked, dict) and raw_ranked.get("error") == "catalog_unavailable":
+            print("        Matcher Agent has no copy of the catalog — sending the scheme records by value")
+            raw_ranked = await call_sub_agent_async(MATCHER_AGENT_URL, {
+                "citizen": citizen, "eligible_schemes": schemes_to_rank, "llm_budget_ms": llm_budget_ms(),
+            })
+        if isinstance(raw_ranked, dict) and "error" in raw_ranked:
+            return [], {"count": 0, "ok": False, "error": raw_ranked["error"]}
+        ranking = raw_ranked if isinstance(raw_ranked, list) else raw_ranked.get("ranked", [])
+        why_status = raw_ranked.get("enrichments", {}).get("llm_why", {}) if isinstance(raw_ranked, dict) else {}
+        # The Matcher answers by reference too; re-attach the evaluated scheme records
+        evaluated = {s["scheme_id"]: s for s in schemes_to_rank}
+        ranked_schemes = [{**evaluated.get(r.get("scheme_id"), {}), **r} for r in ranking]
+        if not evaluation["eligible"] and all("distance" in s for s in ranked_schemes):
+            ranked_schemes.sort(key=lambda s: s["distance"])
+            for i, s in enumerate(ranked_schemes):
+                s["rank"] = i + 1
+        print(f"        Ranked: {len(ranked_schemes)}")
+        return ranked_schemes, {"count": len(ranked_schemes), "ok": bool(ranked_schemes), "enrichment": why_status}
+
+    # Step 4 — VC (only if genuinely eligible); independent of ranking
+    async def vc_issuance(inputs):
+        eligible_schemes = inputs["eligibility_check"]["eligible"]
+        if not eligible_schemes:
+            print("  [vc_issuance] No VC — no eligible schemes")
+            return None, {"count": 0, "ok": False}
+        print("  [vc_issuance] Issuing Verifiable Credential...")
+        refs = [{"scheme_id": s["scheme_id"]} for s in eligible_schemes]
+        raw_vc = await call_sub_agent_async(CREDENTIAL_AGENT_URL, {"citizen": citizen, "catalog_version": version, "eligible_schemes": refs})
+        if isinstance(raw_vc, dict) and raw_vc.get("error") == "catalog_unavailable":
+            print("        Credential Agent has no copy of the catalog — sending the scheme records by value")
+            raw_vc = await call_sub_agent_async(CREDENTIAL_AGENT_URL, {"citizen": citizen, "eligible_schemes": eligible_schemes})
         vc = raw_vc if isinstance(raw_vc, dict) and "credentialSubject" in raw_vc else raw_vc.get("vc") if isinstance(raw_vc, dict) else None
-        pipeline.append({"step": "vc_issuance", "count": None, "ok": vc is not None})
-    else:
-        pipeline.append({"step": "vc_issuance", "count": 0, "ok": False})
-        print("  [4/4] No VC — no eligible schemes")
+        return vc, {"count": None, "ok": vc is not None}
+
+    try:
+        results, pipeline, timing = await run_pipeline_dag({
+            "policy_fetch":            ([], policy_fetch),
+            "eligibility_check":       (["policy_fetch"], eligibility_check),
+            "eligibility_explanation": (["policy_fetch"] if EXPLANATION_LLM else ["eligibility_check"], eligibility_explanation),
+            "scheme_ranking":          (["eligibility_check"], scheme_ranking),
+            "vc_issuance":             (["eligibility_check"], vc_issuance),
+        }, seed=cached, shared=shared, publish=publish)
+    finally:
+        if publish is not None and _in_flight.get(flight_key) is publish:
+            del _in_flight[flight_key]
+
+    # Keep every step worth replaying; steps whose LLM text missed the budget
+    # are left out so the next identical request retries just those.
+    # The VC is always re-issued per citizen.
+    reports = {p["step"]: p for p in pipeline}
+    if version and reports["policy_fetch"]["ok"] and reports["eligibility_check"]["ok"]:
+        fresh = {
+            name: (results[name], {k: reports[name][k] for k in ("count", "ok", "enrichment") if k in reports[name]})
+            for name in ("policy_fetch", "eligibility_check", "eligibility_explanation", "scheme_ranking")
+            if _cacheable(reports[name])
+        }
+        if fresh:
+            pipeline_cache.put(cache_key, version, {**cached, **fresh})
+
+    evaluation       = results["eligibility_check"] or {"eligible": [], "partial": []}
+    explanation      = results["eligibility_explanation"] or {"llm_summary": "", "llm_advice": ""}
+    if not explanation["llm_summary"] and evaluation.get("explanation"):
+        # No LLM text (skipped, dropped or failed): the template text from eligibility_check
+        explanation = {**explanation, **evaluation["explanation"]}
+    eligible_schemes = evaluation["eligible"]
+    partial_schemes  = evaluation["partial"]
+    ranked_schemes   = results["scheme_ranking"] or []
+    vc               = results["vc_issuance"]
+    using_partial    = len(eligible_schemes) == 0 and bool(partial_schemes)
+    print(f"  Pipeline: {timing['total_ms']} ms (steps sum {timing['sum_of_steps_ms']} ms, overlap {timing['overlap_ms']} ms)")
+
+    enrichments = {
+        "eligibility_explanation": reports["eligibility_explanation"].get("enrichment"),
+        "scheme_why":              reports["scheme_ranking"].get("enrichment", {}),
+    }
+    skipped = [name for name, report in reports.items() if report.get("enrichment") and not _cacheable({"enrichment": report["enrichment"]})]
 
     # Summary
-    if using_partial:
-        summary = f"No exact matches found. Showing {len(ranked_schemes)} nearest partial matches."
+    if not reports["eligibility_check"]["ok"]:
+        summary = "Eligibility could not be checked right now. Please try again shortly."
+    elif using_partial:
+        summary = f"No exact matches found. Showing the {len(ranked_schemes)} schemes you are closest to qualifying for."
     elif len(eligible_schemes) == 1:
         summary = f"You are eligible for 1 government scheme."
     else:
@@ -199,15 +751,226 @@ def message_handler(message: AgentMessage, topic: str):
         "summary":          summary,
         "total_eligible":   len(eligible_schemes),
         "pipeline":         pipeline,
+        "pipeline_timing":  timing,
+        "budget":           {"budget_ms": budget_ms, "used_ms": timing["total_ms"], "skipped_enrichments": skipped},
+        "enrichments":      enrichments,
+        "cache":            {"hit": bool(cached), "cached_steps": sorted(cached), "coalesced_steps": sorted(shared), "catalog_version": version},
         "agent_id":         agent.agent_id,
-        "llm_summary":      llm_summary,
-        "llm_advice":       llm_advice,
+        "llm_summary":      explanation["llm_summary"],
+        "llm_advice":       explanation["llm_advice"],
+        # Set while the LLM text is still being written; fetch it with
+        # {"request": "explanation", "token": ...} or over /webhook/stream
+        "explanation_token": explanation.get("explanation_token"),
     }
+    return result
+
+
+def message_handler(message: AgentMessage, topic: str):
+    print("\n" + "=" * 52)
+    print("[Citizen Agent] New request received")
+
+    citizen = extract_citizen_profile(message.content)
+    if citizen.get("request") in ("stats", "cache_stats"):
+        stats = {
+            "cache":      pipeline_cache.stats(),
+            "coalescing": {**_flight_stats, "in_flight": len(_in_flight)},
+            "hedging":    run_on_loop(hedge_stats()),
+        }
+        agent.set_response(message.message_id, json.dumps(stats))
+        return
+    if citizen.get("request") == "explanation":
+        try:
+            wait_ms = int(citizen.get("wait_ms") or 0)
+        except (TypeError, ValueError):
+            agent.set_response(message.message_id, json.dumps({"error": "wait_ms must be an integer"}))
+            return
+        job = run_on_loop(fetch_explanation(str(citizen.get("token", "")), wait_ms))
+        agent.set_response(message.message_id, json.dumps(job))
+        return
+    try:
+        budget_ms = int(citizen.get("budget_ms") or PIPELINE_BUDGET_MS)
+    except (TypeError, ValueError):
+        agent.set_response(message.message_id, json.dumps({"error": "budget_ms must be an integer"}))
+        return
+    print(f"  Profile: {citizen}")
+
+    result = run_on_loop(run_citizen_pipeline(citizen, budget_ms))
     print("[Citizen Agent] Done.\n")
     agent.set_response(message.message_id, json.dumps(result))
 
 
-agent.add_message_handler(message_handler)
+# ── Bulk evaluation (POST /webhook/stream) ───────────────────────────────────
+
+def parse_bulk_profiles(payload: dict) -> list:
+    """
+    Citizen profiles from a bulk upload.
+
+    Accepts `{"profiles": [...]}`, or `data` holding CSV (header row with
+    age,income,category,state,...) or NDJSON text. Rows that cannot be parsed
+    are kept as `{"_error": ...}` so result rows line up with the upload.
+    """
+    if isinstance(payload.get("profiles"), list):
+        rows = payload["profiles"]
+    else:
+        text = payload.get("data") or ""
+        fmt  = str(payload.get("format") or "").lower()
+        if not fmt:
+            is_json = "json" in payload.get("content_type", "") or text.lstrip().startswith("{")
+            fmt = "ndjson" if is_json else "csv"
+        if fmt == "csv":
+            rows = []
+            reader = csv.DictReader(io.StringIO(text))
+            for r in reader:
+                if None in r:  # DictReader files surplus fields under the key None
+                    rows.append({"_error": f"Line {reader.line_num} has {len(r[None])} more field(s) than the header"})
+                else:
+                    rows.append(dict(r))
+        else:
+            rows = []
+            for line in text.splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    rows.append({"_error": f"Invalid JSON line: {e}"})
+
+    profiles = []
+    for row in rows:
+        if not isinstance(row, dict):
+            profiles.append({"_error": "Profile must be an object"})
+            continue
+        if "_error" in row:
+            profiles.append(row)
+            continue
+        try:
+            profiles.append({
+                **row,
+                "age":      int(float(row.get("age") or 0)),
+                "income":   int(float(row.get("income") or 0)),
+                "category": (row.get("category") or "general").strip(),
+                "state":    (row.get("state") or "").strip(),
+            })
+        except (TypeError, ValueError, AttributeError) as e:
+            profiles.append({**row, "_error": f"Invalid profile: {e}"})
+    return profiles
+
+
+def explanation_stream(token: str):
+    """Push an async explanation: a "pending" record if needed, then the text once ready."""
+    job = run_on_loop(fetch_explanation(token))
+    if job.get("status") == "pending":
+        yield {"type": "explanation", **job}
+        job = run_on_loop(fetch_explanation(token, EXPLANATION_PUSH_WAIT_MS))
+    yield {"type": "explanation", **job}
+
+
+def bulk_stream_handler(message: AgentMessage, topic: str):
+    """
+    Screen a whole beneficiary list against the catalog.
+
+    The catalog version is resolved once (the Eligibility Agent keeps that
+    snapshot locally), profiles are sent to the Eligibility Agent in batches
+    of BULK_BATCH_SIZE (template explanations with `"explain": true`, LLM
+    text with `"llm": true`), and one
+    NDJSON record per citizen is streamed back with running progress counters.
+    `"min_score"` (e.g. 67) also returns partial matches at or above that score.
+
+    `{"request": "explanation", "token": ...}` instead streams a pipeline's
+    pending LLM explanation (see `explanation_stream`).
+    """
+    content = message.content if isinstance(message.content, dict) else {}
+    payload = content.get("metadata") or content
+    if payload.get("request") == "explanation":
+        yield from explanation_stream(str(payload.get("token", "")))
+        return
+    if "data" not in payload and "profiles" not in payload:
+        payload = {**payload, **{k: content[k] for k in ("data", "content_type") if k in content}}
+    explain = "llm" if payload.get("llm") else bool(payload.get("explain", False))
+    try:
+        min_score = int(payload.get("min_score", 100))
+    except (TypeError, ValueError):
+        yield {"type": "error", "error": "min_score must be an integer"}
+        return
+
+    t0 = time.perf_counter()
+    profiles = parse_bulk_profiles(payload)
+    total = len(profiles)
+    print(f"[Citizen Agent] Bulk evaluation of {total} profiles")
+    yield {"type": "start", "total": total, "batch_size": BULK_BATCH_SIZE, "llm": explain == "llm"}
+
+    raw = call_sub_agent(POLICY_AGENT_URL, {"request": "catalog_version"})
+    version = raw.get("version") if isinstance(raw, dict) else None
+    if not version:
+        yield {"type": "error", "error": "Scheme catalog unavailable"}
+        return
+    yield {"type": "catalog", "schemes": raw.get("count"), "catalog_version": version}
+
+    async def run_batch(start: int) -> tuple:
+        rows = profiles[start:start + BULK_BATCH_SIZE]
+        valid = [i for i, p in enumerate(rows) if "_error" not in p]
+        request = {"citizens": [rows[i] for i in valid], "catalog_version": version, "explain": explain, "min_score": min_score}
+        # A batch with LLM text that timed out is not sent again: it would
+        # repeat every LLM call while the first attempt may still be running.
+        retry_timeouts = explain != "llm"
+        raw = await call_sub_agent_async(ELIGIBILITY_AGENT_URL, request, timeout=120, retry_timeouts=retry_timeouts)
+        if isinstance(raw, dict) and raw.get("error") == "catalog_unavailable":
+            by_value = await with_schemes_by_value(request)
+            if by_value:
+                raw = await call_sub_agent_async(ELIGIBILITY_AGENT_URL, by_value, timeout=120, retry_timeouts=retry_timeouts)
+        by_row, stats = {}, {}
+        if isinstance(raw, dict) and isinstance(raw.get("results"), list):
+            for r in raw["results"]:
+                by_row[valid[r["index"]]] = r
+            stats = raw.get("stats") or {}
+        else:
+            err = raw.get("error", "Eligibility Agent failed") if isinstance(raw, dict) else "Eligibility Agent failed"
+            by_row = {i: {"error": err} for i in valid}
+        return start, rows, by_row, stats
+
+    processed = errors = eligible_citizens = 0
+    kernel_ms = kernel_profiles = 0
+    in_flight = deque()
+    next_start = 0
+    while next_start < total or in_flight:
+        while next_start < total and len(in_flight) < max(1, BULK_CONCURRENCY):
+            in_flight.append(asyncio.run_coroutine_threadsafe(run_batch(next_start), _loop))
+            next_start += BULK_BATCH_SIZE
+        start, rows, by_row, stats = in_flight.popleft().result()
+        kernel_ms += stats.get("elapsed_ms", 0)
+        kernel_profiles += stats.get("profiles", 0)
+        for i, profile in enumerate(rows):
+            processed += 1
+            outcome = {"error": profile["_error"]} if "_error" in profile else by_row.get(i, {"error": "No result"})
+            record = {"type": "result", "row": start + i, "citizen": {k: v for k, v in profile.items() if k != "_error"}}
+            if "error" in outcome:
+                errors += 1
+                record["error"] = outcome["error"]
+            else:
+                eligible_citizens += outcome["eligible_count"] > 0
+                record.update({k: v for k, v in outcome.items() if k != "index"})
+            record["progress"] = {"processed": processed, "total": total, "errors": errors}
+            yield record
+
+    elapsed = time.perf_counter() - t0
+    yield {
+        "type":              "summary",
+        "total":             total,
+        "processed":         processed,
+        "errors":            errors,
+        "eligible_citizens": eligible_citizens,
+        "catalog_version":   version,
+        "elapsed_ms":        round(elapsed * 1000),
+        "profiles_per_sec":  round(processed / elapsed, 1) if elapsed > 0 else None,
+        # Time spent inside the Eligibility Agent's batch kernel, excluding transport
+        "kernel_ms":               round(kernel_ms, 1),
+        "kernel_profiles_per_sec": round(kernel_profiles / kernel_ms * 1000) if kernel_ms > 0 else None,
+    }
+
+
+if __name__ == "__main__":
+    agent.add_message_handler(message_handler)
+    agent.add_stream_handler(bulk_stream_handler)
 
-while True:
-    time.sleep(60)
+    while True:
+        time.sleep(60)
@@ -1,5 +1,6 @@
 from zyndai_agent.agent import AgentConfig, ZyndAIAgent
 from zyndai_agent.message import AgentMessage
+from zyndai_agent.catalog import CatalogSnapshots, CatalogUnavailable
 from dotenv import load_dotenv
 from pathlib import Path
 from datetime import datetime, timezone, timedelta
@@ -9,6 +10,9 @@ env_path = Path(__file__).resolve().parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
 port = int(os.environ.get("PORT", 5004))
+# First URL when the orchestrator's setting lists several replicas.
+POLICY_AGENT_URL = os.environ.get("POLICY_AGENT_URL", "http://localhost:5001").split(",")[0].strip()
+CATALOG_SNAPSHOTS_KEPT = int(os.environ.get("CATALOG_SNAPSHOTS_KEPT", 3))
 
 config = AgentConfig(
     name="Credential Agent",
@@ -29,6 +33,12 @@ agent = ZyndAIAgent(config)
 print(f"[Credential Agent] Running on port {port} | ID: {agent.agent_id}")
 
 
+# ── Catalog snapshots (by-reference requests) ────────────────────────────────
+# Requests may carry only `catalog_version` + scheme ids; the schemes for that
+# version are fetched from the Policy Agent once and kept locally.
+catalog_snapshots = CatalogSnapshots(POLICY_AGENT_URL, agent.agent_id, "Credential Agent", CATALOG_SNAPSHOTS_KEPT)
+
+
 def generate_citizen_did(citizen: dict) -> str:
     seed = f"{citizen.get('email', '')}{citizen.get('age', '')}{citizen.get('state', '')}{citizen.get('category', '')}"
     h = hashlib.sha256(seed.encode()).hexdigest()[:32]
@@ -45,12 +55,20 @@ def extract_data(content):
     citizen = data.get("citizen", {})
     # Accept both 'matched_schemes' (legacy) and 'eligible_schemes' (current orchestrator)
     schemes = data.get("matched_schemes") or data.get("eligible_schemes") or []
+    # By-reference request: entries carry only scheme ids for `catalog_version`
+    if data.get("catalog_version") and schemes:
+        _, by_id = catalog_snapshots.get(data["catalog_version"])
+        schemes = [{**by_id.get(s.get("scheme_id") or s.get("id"), {}), **s} for s in schemes]
     return citizen, schemes
 
 
 def message_handler(message: AgentMessage, topic: str):
     print("[Credential Agent] Issuing VC")
-    citizen, matched_schemes = extract_data(message.content)
+    try:
+        citizen, matched_schemes = extract_data(message.content)
+    except CatalogUnavailable as e:
+        agent.set_response(message.message_id, json.dumps({"error": "catalog_unavailable", "catalog_version": e.version}))
+        return
 
     now = datetime.now(timezone.utc)
     issued_at = now.isoformat()
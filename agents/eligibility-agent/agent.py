@@ -1,8 +1,14 @@
 from zyndai_agent.agent import AgentConfig, ZyndAIAgent
 from zyndai_agent.message import AgentMessage
+from zyndai_agent.llm import run_llm_with_budget
+from zyndai_agent.catalog import CatalogSnapshots, CatalogUnavailable
+from zyndai_agent.rules import condition_text, condition_predicate, describe_condition, condition_fields, with_compiled_rules
 from dotenv import load_dotenv
 from pathlib import Path
-import os, time, json
+import os, time, json, threading, secrets, sqlite3, hashlib
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
 
 try:
     from openai import OpenAI as _OpenAI
@@ -10,12 +16,107 @@ try:
 except ImportError:
     _openai_available = False
 
+try:
+    import numpy as np
+    _numpy_available = True
+except ImportError:
+    _numpy_available = False
+
 env_path = Path(__file__).resolve().parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
 port = int(os.environ.get("PORT", 5002))
+# First URL when the orchestrator's setting lists several replicas.
+POLICY_AGENT_URL = os.environ.get("POLICY_AGENT_URL", "http://localhost:5001").split(",")[0].strip()
+CATALOG_SNAPSHOTS_KEPT = int(os.environ.get("CATALOG_SNAPSHOTS_KEPT", 3))
+# Batch mode: citizen × scheme pairs evaluated per block (bounds kernel memory).
+EVAL_CHUNK_CELLS = int(os.environ.get("EVAL_CHUNK_CELLS", 2_000_000))
+# Batch mode with LLM explanations: the calls run concurrently on the LLM
+# pool, and whatever is not back within this budget keeps the template text
+# (override per request with llm_budget_ms).
+BATCH_LLM_BUDGET_MS = int(os.environ.get("BATCH_LLM_BUDGET_MS", 20000))
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 _llm = _OpenAI(api_key=OPENAI_API_KEY) if (_openai_available and OPENAI_API_KEY) else None
+_llm_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("LLM_WORKERS", 8)), thread_name_prefix="llm")
+# What `explain: true` produces: "template" (built from the rule outcomes, no
+# LLM call) or "llm". Requests can always ask for either explicitly.
+EXPLANATION_ENGINE = os.environ.get("EXPLANATION_ENGINE", "template")
+# Async explanations: jobs kept for follow-up fetches, and the longest a fetch may wait.
+EXPLANATION_JOBS_KEPT = int(os.environ.get("EXPLANATION_JOBS_KEPT", 2000))
+EXPLANATION_JOB_TTL   = float(os.environ.get("EXPLANATION_JOB_TTL", 600))
+EXPLANATION_MAX_WAIT_MS = int(os.environ.get("EXPLANATION_MAX_WAIT_MS", 30000))
+# Incremental re-evaluation: evaluations kept for follow-up deltas, and for how long.
+EVALUATION_HANDLES_KEPT = int(os.environ.get("EVALUATION_HANDLES_KEPT", 5000))
+EVALUATION_HANDLE_TTL   = float(os.environ.get("EVALUATION_HANDLE_TTL", 1800))
+# Explanation cache: in-memory LRU entries (0 disables caching), SQLite file behind it
+# ("" keeps it in memory only), and how long a stored explanation stays usable.
+EXPLANATION_CACHE_SIZE = int(os.environ.get("EXPLANATION_CACHE_SIZE", 2048))
+EXPLANATION_CACHE_FILE = os.environ.get(
+    "EXPLANATION_CACHE_FILE", str(Path(__file__).resolve().parent / "explanations.sqlite3"))
+EXPLANATION_CACHE_TTL  = float(os.environ.get("EXPLANATION_CACHE_TTL", 7 * 86400))
+
+# Profile buckets the explanation prompt (and so its cache key) uses instead of
+# exact values; income edges follow common scheme limits.
+AGE_BUCKET_YEARS = 5
+INCOME_BUCKETS   = [0, 50000, 100000, 150000, 200000, 250000, 300000, 500000, 800000, 1000000, 1500000, 2500000, 5000000]
+
+
+def profile_buckets(citizen: dict) -> tuple:
+    """(age band, income band) labels, e.g. ("30-34", "Rs.100,000-149,999")."""
+    age, income, _ = profile_values(citizen)
+    low = age // AGE_BUCKET_YEARS * AGE_BUCKET_YEARS
+    k = max(0, bisect_right(INCOME_BUCKETS, income) - 1)
+    if k + 1 < len(INCOME_BUCKETS):
+        income_band = f"Rs.{INCOME_BUCKETS[k]:,}-{INCOME_BUCKETS[k + 1] - 1:,}"
+    else:
+        income_band = f"Rs.{INCOME_BUCKETS[k]:,} or more"
+    return f"{low}-{low + AGE_BUCKET_YEARS - 1}", income_band
+
+
+def name_list(names: list, last: str = "and") -> str:
+    """"A", "A and B", "A, B and C"."""
+    return names[0] if len(names) == 1 else f"{', '.join(names[:-1])} {last} {names[-1]}"
+
+
+def category_label(category: str) -> str:
+    """"sc_st" -> "SC/ST", "obc" -> "OBC", "senior_citizen" -> "Senior citizen"."""
+    parts = category.split("_")
+    if all(len(p) <= 3 for p in parts):
+        return "/".join(p.upper() for p in parts)
+    return " ".join(parts).capitalize()
+
+
+def template_explain_eligibility(eligible: list, reachable: list, eligible_count: int | None = None) -> dict:
+    """
+    Explanation of the eligibility result built from the rule outcomes alone:
+    which schemes matched, and advice from the counterfactual changes of the
+    nearest missed ones (`reachable`, nearest first; only the first few of
+    them, so they are named rather than counted). Same shape as the LLM's
+    answer, in microseconds. `eligible` may be cut short when
+    `eligible_count` gives the full count.
+    """
+    names = [r.name for r in eligible[:3]]
+    count = len(eligible) if eligible_count is None else eligible_count
+    if names:
+        listed = name_list(names) if count <= 3 else f"{', '.join(names)} and {count - 3} more"
+        summary = f"You qualify for {count} scheme{'s' if count != 1 else ''}: {listed}."
+    else:
+        summary = "You do not qualify for any of the schemes checked yet."
+    close = [r for r in reachable if len(r.changes()) == 1]
+    if close:
+        more = "other schemes" if names else "schemes"
+        summary += f" You are one requirement away from {more} including {name_list([r.name for r in close[:2]])}."
+    elif reachable and not names:
+        best = reachable[0]
+        summary += f" The closest is {best.name}, where you meet {best.passed} of {best.rule.checks} requirements."
+
+    if reachable:
+        tips = " ".join(f"{r.name}: {'; '.join(c['text'] for c in r.changes())}." for r in reachable[:2])
+    elif names:
+        tips = "Keep your identity, income and category certificates ready when you apply."
+    else:
+        tips = "None of the nearest schemes can be reached by a change in your profile; check again as new schemes are added."
+    return {"summary": summary, "advice": tips}
 
 
 def llm_explain_eligibility(citizen: dict, eligible: list, ineligible: list) -> dict:
@@ -23,12 +124,15 @@ def llm_explain_eligibility(citizen: dict, eligible: list, ineligible: list) ->
     if not _llm:
         return {}
     try:
-        scheme_names_ok  = [s["name"] for s in eligible[:5]]
-        scheme_names_fail = [s["name"] for s in ineligible[:3]]
-        fail_reasons     = [r for s in ineligible[:3] for r in s.get("reasons_fail", [])[:1]]
+        # Bucketed profile and scheme-side reasons only, so the same prompt
+        # (and cached answer) fits every citizen with the same cache key
+        age_band, income_band = profile_buckets(citizen)
+        scheme_names_ok  = [s.name for s in eligible[:5]]
+        scheme_names_fail = [s.name for s in ineligible[:3]]
+        fail_reasons     = [r for s in ineligible[:3] for r in s.unmet()[:1]]
         prompt = (
             f"A citizen in India has the following profile:\n"
-            f"  Age: {citizen.get('age')}, Income: Rs.{citizen.get('income'):,}/year, "
+            f"  Age: {age_band}, Income: {income_band}/year, "
             f"Category: {citizen.get('category')}, State: {citizen.get('state', 'India')}\n\n"
             f"They ARE eligible for: {', '.join(scheme_names_ok) if scheme_names_ok else 'no schemes'}\n"
             f"They are NOT eligible for: {', '.join(scheme_names_fail) if scheme_names_fail else 'none checked'}\n"
@@ -51,6 +155,211 @@ def llm_explain_eligibility(citizen: dict, eligible: list, ineligible: list) ->
         print(f"[Eligibility Agent][LLM] {e}")
         return {}
 
+
+class ExplanationJobs:
+    """
+    LLM explanations generated in the background. `submit` starts one on
+    the LLM pool and returns a token; `status` reports it as "pending",
+    "ok" (with the text), "unavailable" (LLM failed or gave nothing) or
+    "unknown" (never issued, expired or evicted).
+    """
+
+    def __init__(self, max_jobs: int, ttl: float):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs = OrderedDict()  # token -> (created, future)
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args) -> str:
+        token = secrets.token_urlsafe(16)
+        future = _llm_pool.submit(fn, *args)
+        with self._lock:
+            self._jobs[token] = (time.monotonic(), future)
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        return token
+
+    def get(self, token: str):
+        with self._lock:
+            job = self._jobs.get(token)
+            if job and time.monotonic() - job[0] > self.ttl:
+                del self._jobs[token]
+                job = None
+        return job[1] if job else None
+
+    def status(self, token: str, wait_ms: int = 0) -> dict:
+        future = self.get(token)
+        if future is None:
+            return {"token": token, "status": "unknown"}
+        if wait_ms > 0 and not future.done():
+            wait_futures([future], timeout=min(wait_ms, EXPLANATION_MAX_WAIT_MS) / 1000)
+        if not future.done():
+            return {"token": token, "status": "pending"}
+        insight = (future.result() if not future.exception() else None) or {}
+        return {
+            "token":       token,
+            "status":      "ok" if insight else "unavailable",
+            "llm_summary": insight.get("summary", ""),
+            "llm_advice":  insight.get("advice", ""),
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = [future for _, future in self._jobs.values()]
+        return {"jobs": len(jobs), "pending": sum(not f.done() for f in jobs), "max_jobs": self.max_jobs}
+
+
+explanation_jobs = ExplanationJobs(EXPLANATION_JOBS_KEPT, EXPLANATION_JOB_TTL)
+
+
+class ExplanationCache:
+    """
+    Explanations by prompt key: an in-memory LRU in front of a SQLite table
+    that survives restarts. Keys include the catalog version; rows of
+    versions that are no longer among the last CATALOG_SNAPSHOTS_KEPT seen
+    are deleted, and every entry expires after `ttl` seconds.
+    """
+
+    def __init__(self, size: int, path: str, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._mem = OrderedDict()  # key -> (stored_at, insight)
+        self._versions = []
+        self._lock = threading.Lock()
+        self._db = None
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stored": 0}
+        if size > 0 and path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS explanations "
+                    "(key TEXT PRIMARY KEY, version TEXT, stored_at REAL, summary TEXT, advice TEXT)")
+                self._db.execute("DELETE FROM explanations WHERE stored_at < ?", (time.time() - ttl,))
+                # Versions already on disk, oldest first, so the first put
+                # after a restart does not prune rows of still-current versions
+                self._versions = [row[0] for row in self._db.execute(
+                    "SELECT version FROM explanations GROUP BY version ORDER BY MAX(stored_at)")][-CATALOG_SNAPSHOTS_KEPT:]
+            except sqlite3.Error as e:
+                print(f"[Eligibility Agent] Explanation cache file unavailable, memory only: {e}")
+                self._db = None
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry and now - entry[0] <= self.ttl:
+                self._mem.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry[1]
+            row = None
+            if self._db:
+                try:
+                    row = self._db.execute(
+                        "SELECT stored_at, summary, advice FROM explanations WHERE key = ?", (key,)).fetchone()
+                except sqlite3.Error as e:
+                    print(f"[Eligibility Agent] Explanation cache read failed: {e}")
+            if row and now - row[0] <= self.ttl:
+                insight = {"summary": row[1], "advice": row[2]}
+                self._remember(key, row[0], insight)
+                self._stats["disk_hits"] += 1
+                return insight
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, version: str, insight: dict):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, insight)
+            self._stats["stored"] += 1
+            if not self._db:
+                return
+            try:
+                if version not in self._versions:
+                    self._versions = (self._versions + [version])[-CATALOG_SNAPSHOTS_KEPT:]
+                    marks = ",".join("?" * len(self._versions))
+                    self._db.execute(f"DELETE FROM explanations WHERE version NOT IN ({marks})", self._versions)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO explanations VALUES (?, ?, ?, ?, ?)",
+                    (key, version, now, insight.get("summary", ""), insight.get("advice", "")))
+            except sqlite3.Error as e:
+                print(f"[Eligibility Agent] Explanation cache write failed: {e}")
+
+    def _remember(self, key: str, stored_at: float, insight: dict):
+        self._mem[key] = (stored_at, insight)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.size:
+            self._mem.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "entries": len(self._mem), "max_entries": self.size, "disk": bool(self._db)}
+
+
+explanation_cache = ExplanationCache(EXPLANATION_CACHE_SIZE, EXPLANATION_CACHE_FILE, EXPLANATION_CACHE_TTL)
+
+
+def explanation_key(version: str, citizen: dict, eligible: list, ineligible: list) -> str | None:
+    """Cache key for the explanation prompt of this outcome; None when caching is off."""
+    if EXPLANATION_CACHE_SIZE <= 0 or not version:
+        return None
+    key = [version, *profile_buckets(citizen), profile_values(citizen)[2], condition_text(citizen.get("state") or ""),
+           [s.scheme.get("id") for s in eligible[:5]],
+           [[s.scheme.get("id"), s.category_ok, s.age_ok, s.income_ok, s.where_ok] for s in ineligible[:3]]]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+
+def explain_and_cache(key: str | None, version: str, citizen: dict, eligible: list, ineligible: list) -> dict:
+    """llm_explain_eligibility, storing the answer under `key`."""
+    insight = llm_explain_eligibility(citizen, eligible, ineligible)
+    if insight and key:
+        explanation_cache.put(key, version, insight)
+    return insight
+
+
+class EvaluationHandles:
+    """
+    Recent single-citizen evaluations by handle: the compiled catalog (the
+    shared one for its version or by-value digest, see `compiled_catalog`),
+    the citizen, the scheme scope and the eligible scheme indices, so a
+    follow-up request can send just the fields that changed (see `reevaluate`).
+    Handles expire after `ttl` seconds; the oldest are evicted beyond
+    `max_handles`.
+    """
+
+    def __init__(self, max_handles: int, ttl: float):
+        self.max_handles = max_handles
+        self.ttl = ttl
+        self._handles = OrderedDict()  # handle -> (created, catalog, version, citizen, within, eligible)
+        self._lock = threading.Lock()
+
+    def put(self, catalog, version: str | None, citizen: dict, within: int | None, eligible: list) -> str | None:
+        if self.max_handles <= 0:
+            return None
+        handle = secrets.token_urlsafe(16)
+        with self._lock:
+            self._handles[handle] = (time.monotonic(), catalog, version, citizen, within, eligible)
+            while len(self._handles) > self.max_handles:
+                self._handles.popitem(last=False)
+        return handle
+
+    def get(self, handle: str) -> tuple | None:
+        """(catalog, version, citizen, within, eligible) or None when unknown or expired."""
+        with self._lock:
+            entry = self._handles.get(handle)
+            if entry and time.monotonic() - entry[0] > self.ttl:
+                del self._handles[handle]
+                entry = None
+        return entry[1:] if entry else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"handles": len(self._handles), "max_handles": self.max_handles}
+
+
+evaluation_handles = EvaluationHandles(EVALUATION_HANDLES_KEPT, EVALUATION_HANDLE_TTL)
+
+
 config = AgentConfig(
     name="Eligibility Agent",
     description="Evaluates citizen eligibility for all schemes using a multi-criteria rule engine",
@@ -70,54 +379,479 @@ agent = ZyndAIAgent(config)
 print(f"[Eligibility Agent] Running on port {port} | ID: {agent.agent_id}")
 
 
-def check_scheme_eligibility(citizen: dict, scheme: dict) -> dict:
-    """Apply rule engine to check if citizen is eligible for a scheme."""
-    rules = scheme.get("rules", {})
+# ── Catalog snapshots (by-reference requests) ────────────────────────────────
+# Requests may carry only `catalog_version` + scheme ids; the schemes for that
+# version are fetched from the Policy Agent once and kept locally.
+catalog_snapshots = CatalogSnapshots(POLICY_AGENT_URL, agent.agent_id, "Eligibility Agent", CATALOG_SNAPSHOTS_KEPT)
 
-    age = int(citizen.get("age", 0))
-    income = int(citizen.get("income", 0))
-    category = str(citizen.get("category", "general")).lower()
 
-    reasons_pass, reasons_fail = [], []
+class SchemeRule:
+    """
+    A scheme's compiled rules as a predicate over (age, income, category),
+    plus `where_ok` over the whole citizen when the scheme has other conditions.
+    """
+    __slots__ = ("categories", "category_set", "open", "age_min", "age_max", "income_max",
+                 "where", "where_ok", "checks")
 
-    # Category check
-    allowed = [c.lower() for c in rules.get("categories", ["general"])]
-    if category in allowed or "general" in allowed:
-        reasons_pass.append(f"Category '{category}' matches scheme")
-    else:
-        reasons_fail.append(f"Category '{category}' not in {allowed}")
+    def __init__(self, compiled: dict):
+        self.categories   = compiled["categories"]
+        self.category_set = frozenset(compiled["categories"])
+        self.open         = compiled["open"]
+        self.age_min      = compiled["age_min"]
+        self.age_max      = compiled["age_max"]
+        self.income_max   = compiled["income_max"]
+        self.where        = compiled.get("where")
+        self.where_ok     = condition_predicate(self.where)[0] if self.where else None
+        self.checks       = 4 if self.where else 3
 
-    # Age check
-    age_min = rules.get("age_min", 0)
-    age_max = rules.get("age_max", 120)
-    if age_min <= age <= age_max:
-        reasons_pass.append(f"Age {age} within allowed range {age_min}-{age_max}")
-    else:
-        reasons_fail.append(f"Age {age} outside allowed range {age_min}-{age_max}")
+    @classmethod
+    def for_scheme(cls, scheme: dict) -> "SchemeRule":
+        return cls(with_compiled_rules(scheme)["compiled_rules"])
 
-    # Income check
-    income_max = rules.get("income_max", 10000000)
-    if income <= income_max:
-        reasons_pass.append(f"Income Rs.{income:,} within limit Rs.{income_max:,}")
-    else:
-        reasons_fail.append(f"Income Rs.{income:,} exceeds limit Rs.{income_max:,}")
-
-    eligible = len(reasons_fail) == 0
-    total = len(reasons_pass) + len(reasons_fail)
-    score = round((len(reasons_pass) / total) * 100) if total > 0 else 0
-
-    return {
-        "scheme_id": scheme.get("id"),
-        "name": scheme.get("name"),
-        "category": scheme.get("category"),
-        "eligible": eligible,
-        "match_score": score,
-        "reasons_pass": reasons_pass,
-        "reasons_fail": reasons_fail,
-        "description": scheme.get("description"),
-        "benefits": scheme.get("benefits"),
-        "eligibility_text": scheme.get("eligibility_text"),
-    }
+    def category_ok(self, category: str) -> bool:
+        return self.open or category in self.category_set
+
+    def age_ok(self, age) -> bool:
+        return self.age_min <= age <= self.age_max
+
+    def income_ok(self, income) -> bool:
+        return income <= self.income_max
+
+
+# match_score by checks passed, for schemes with 3 checks and with a `where` (4)
+MATCH_SCORES = {checks: [round(p / checks * 100) for p in range(checks + 1)] for checks in (3, 4)}
+
+# Counterfactual distance to eligibility: each unmet check costs 1 plus how
+# far off it is — years to wait / COUNTERFACTUAL_AGE_YEARS, the share of the
+# income over the limit, or 1 for a category or other condition that does
+# not match. Schemes the citizen is too old for are out of reach.
+COUNTERFACTUAL_AGE_YEARS = 10
+MISMATCH_DISTANCE = 2.0
+
+
+def eligibility_distance(rule: SchemeRule, age, income, category_ok: bool) -> float:
+    """Distance to a scheme over the age, income and category checks (its `where` not counted)."""
+    if age > rule.age_max:
+        return float("inf")
+    distance = 0.0 if category_ok else MISMATCH_DISTANCE
+    if age < rule.age_min:
+        distance += 1 + (rule.age_min - age) / COUNTERFACTUAL_AGE_YEARS
+    if income > rule.income_max:
+        distance += 1 + (income - rule.income_max) / max(1, income)
+    return distance
+
+
+def bit_indices(bits: int, limit: int | None = None) -> list:
+    """Positions of the set bits in `bits`, lowest first."""
+    # Scanning the binary string is linear; peeling off low bits one at a
+    # time is not, since each step copies the whole int.
+    digits = bin(bits)[:1:-1]
+    out, i = [], digits.find("1")
+    while i >= 0 and (limit is None or len(out) < limit):
+        out.append(i)
+        i = digits.find("1", i + 1)
+    return out
+
+
+def index_bits(indices) -> int:
+    """Bitset with the given positions set; the inverse of bit_indices."""
+    indices = list(indices)
+    if not indices:
+        return 0
+    digits = bytearray(b"0" * (max(indices) + 1))
+    for i in indices:
+        digits[-1 - i] = 49  # "1"
+    return int(digits, 2)
+
+
+class BoundIndex:
+    """
+    Bitsets of schemes by one numeric bound, one per distinct bound value, so
+    "all schemes whose age_min <= 34" is a bisect plus a lookup. `kind` is
+    "min" (scheme passes when bound <= x) or "max" (passes when x <= bound).
+    """
+
+    def __init__(self, values: list, kind: str):
+        self.kind = kind
+        groups = {}
+        for i, v in enumerate(values):
+            groups[v] = groups.get(v, 0) | (1 << i)
+        self.keys = sorted(groups)
+        self.bits, acc = [], 0
+        for key in (self.keys if kind == "min" else reversed(self.keys)):
+            acc |= groups[key]
+            self.bits.append(acc)
+        if kind == "max":
+            self.bits.reverse()
+
+    def match(self, x) -> int:
+        if self.kind == "min":
+            k = bisect_right(self.keys, x) - 1
+            return self.bits[k] if k >= 0 else 0
+        k = bisect_left(self.keys, x)
+        return self.bits[k] if k < len(self.keys) else 0
+
+
+def profile_values(citizen: dict) -> tuple:
+    """(age, income, category) as the rule engine compares them; raises on bad values."""
+    return int(citizen.get("age", 0)), int(citizen.get("income", 0)), str(citizen.get("category", "general")).lower()
+
+
+class CompiledCatalog:
+    """
+    A list of schemes with their SchemeRules and, when NumPy is available, a
+    columnar copy of the rules: age_min / age_max / income_max vectors, an
+    "open to all" vector and a scheme × category boolean matrix. A citizen is
+    then checked against every scheme with a few array operations; without
+    NumPy the same checks run as a plain loop.
+
+    Single lookups go through bitset indexes instead (category → schemes,
+    plus a BoundIndex per numeric bound), which also yield the near misses
+    without touching the other schemes.
+
+    Schemes with other conditions (`where`) are listed in `conditional`; those
+    predicates only run for schemes that already pass the numeric checks.
+    """
+
+    def __init__(self, schemes: list):
+        self.schemes = schemes
+        self.rules = [SchemeRule.for_scheme(s) for s in schemes]
+        self.index = {s.get("id"): i for i, s in enumerate(schemes)}
+        self.refs = [(s.get("id"), s.get("name")) for s in schemes]
+        self.all_bits = (1 << len(schemes)) - 1
+        self.open_bits = 0
+        self.category_bits = {}
+        for i, r in enumerate(self.rules):
+            if r.open:
+                self.open_bits |= 1 << i
+            for c in r.categories:
+                self.category_bits[c] = self.category_bits.get(c, 0) | (1 << i)
+        self.age_min_index    = BoundIndex([r.age_min for r in self.rules], "min")
+        self.age_max_index    = BoundIndex([r.age_max for r in self.rules], "max")
+        self.income_max_index = BoundIndex([r.income_max for r in self.rules], "max")
+        self.conditional = [i for i, r in enumerate(self.rules) if r.where_ok]
+        self.conditional_bits = sum(1 << i for i in self.conditional)
+        self.where_field_bits = {}  # citizen field -> schemes whose `where` reads it
+        for i in self.conditional:
+            for field in condition_fields(self.rules[i].where):
+                self.where_field_bits[field] = self.where_field_bits.get(field, 0) | (1 << i)
+        self.vectorized = _numpy_available
+        if self.vectorized:
+            self.age_min    = np.array([r.age_min for r in self.rules], dtype=np.float64)
+            self.age_max    = np.array([r.age_max for r in self.rules], dtype=np.float64)
+            self.income_max = np.array([r.income_max for r in self.rules], dtype=np.float64)
+            self.open       = np.array([r.open for r in self.rules], dtype=bool)
+            self.conditional_mask = np.array([bool(r.where_ok) for r in self.rules], dtype=bool)
+            vocab = sorted({c for r in self.rules for c in r.categories})
+            self.category_column = {c: j for j, c in enumerate(vocab)}
+            self.category_matrix = np.zeros((len(self.rules), len(vocab)), dtype=bool)
+            for i, r in enumerate(self.rules):
+                for c in r.categories:
+                    self.category_matrix[i, self.category_column[c]] = True
+            # Category → scheme rows for the batch kernel; the extra last row
+            # (all False) is what unknown categories index with -1.
+            self.category_rows = np.vstack([self.category_matrix.T, np.zeros((1, len(self.rules)), dtype=bool)])
+
+    def __len__(self) -> int:
+        return len(self.schemes)
+
+    def evaluate(self, age, income, category: str) -> list:
+        """Numeric checks passed (0-3) per scheme for one citizen; `evaluate_matrix` without NumPy."""
+        return [r.category_ok(category) + r.age_ok(age) + r.income_ok(income) for r in self.rules]
+
+    def apply_conditions(self, passed, citizen: dict, floor: int):
+        """Count the `where` check into one citizen's row of checks passed, for conditional schemes at `floor` or above."""
+        for j in self.conditional:
+            if passed[j] >= floor:
+                passed[j] += self.rules[j].where_ok(citizen)
+
+    def evaluate_matrix(self, ages, incomes, categories) -> "np.ndarray":
+        """Checks passed (0-3) for every citizen × scheme pair of a block, as an int8 matrix."""
+        ages = np.asarray(ages, dtype=np.float64)[:, None]
+        incomes = np.asarray(incomes, dtype=np.float64)[:, None]
+        columns = np.array([self.category_column.get(c, -1) for c in categories], dtype=np.intp)
+        passed = (self.open | self.category_rows[columns]).astype(np.int8)
+        passed += (self.age_min <= ages) & (ages <= self.age_max)
+        passed += incomes <= self.income_max
+        return passed
+
+    def bits_for(self, scheme_ids: list) -> int:
+        bits = 0
+        for sid in scheme_ids:
+            if sid in self.index:
+                bits |= 1 << self.index[sid]
+        return bits
+
+    def lookup(self, citizen: dict, partial_limit: int = 0, within: int | None = None) -> tuple:
+        """
+        (eligible scheme indices, up to `partial_limit` near misses) for one
+        citizen, optionally restricted to the schemes in bitset `within`.
+        Near misses come by match_score, catalog order within a score; the
+        `where` of a conditional scheme is only evaluated here when its score
+        decides the order.
+        """
+        age, income, category = profile_values(citizen)
+        scope = self.all_bits if within is None else within
+        cat = self.open_bits | self.category_bits.get(category, 0)
+        age_ok = self.age_min_index.match(age) & self.age_max_index.match(age)
+        inc = self.income_max_index.match(income)
+        base = cat & age_ok & inc & scope
+        failed = 0
+        for j in bit_indices(base & self.conditional_bits):
+            if not self.rules[j].where_ok(citizen):
+                failed |= 1 << j
+        eligible = base & ~failed
+        partial = []
+        if partial_limit:
+            two = ((cat & age_ok) | (cat & inc) | (age_ok & inc)) & scope & ~base
+            one = (cat | age_ok | inc) & scope & ~(two | base)
+            none = scope & ~(cat | age_ok | inc)
+            by_score = {MATCH_SCORES[4][3]: failed}
+            for count, tier in ((2, two), (1, one), (0, none)):
+                score = MATCH_SCORES[3][count]
+                by_score[score] = by_score.get(score, 0) | (tier & ~self.conditional_bits)
+                for j in bit_indices(tier & self.conditional_bits):
+                    score = MATCH_SCORES[4][count + bool(self.rules[j].where_ok(citizen))]
+                    by_score[score] = by_score.get(score, 0) | (1 << j)
+            for score in sorted(by_score, reverse=True):
+                if len(partial) >= partial_limit:
+                    break
+                partial += bit_indices(by_score[score], partial_limit - len(partial))
+        return bit_indices(eligible), partial
+
+    def affected(self, before: dict, after: dict) -> int:
+        """
+        Bitset of the schemes whose outcome can differ between two versions of
+        a citizen: those whose age, income or category check flips between
+        the old and new values (read off the same indexes as `lookup`), plus
+        every scheme whose `where` reads a field that changed.
+        """
+        bits = 0
+        for field in before.keys() | after.keys():
+            if before.get(field) != after.get(field):
+                bits |= self.where_field_bits.get(field, 0)
+        (age0, income0, category0), (age1, income1, category1) = profile_values(before), profile_values(after)
+        if age0 != age1:
+            bits |= (self.age_min_index.match(age0) & self.age_max_index.match(age0)) ^ \
+                    (self.age_min_index.match(age1) & self.age_max_index.match(age1))
+        if income0 != income1:
+            bits |= self.income_max_index.match(income0) ^ self.income_max_index.match(income1)
+        if category0 != category1:
+            bits |= self.category_bits.get(category0, 0) ^ self.category_bits.get(category1, 0)
+        return bits
+
+    def reevaluate(self, before: dict, after: dict, eligible: int, within: int | None = None) -> tuple:
+        """
+        Eligibility of `after` from that of `before` (bitset `eligible`) by
+        checking only the `affected` schemes again. Returns (merged eligible
+        bitset, schemes re-evaluated).
+        """
+        affected = self.affected(before, after) & (self.all_bits if within is None else within)
+        fresh = index_bits(self.lookup(after, within=affected)[0]) if affected else 0
+        return (eligible & ~affected) | fresh, bin(affected).count("1")
+
+    def distances(self, age, income, category: str) -> "np.ndarray":
+        """eligibility_distance to every scheme as one vector (inf where out of reach)."""
+        column = self.category_column.get(category)
+        category_ok = self.open if column is None else (self.open | self.category_matrix[:, column])
+        wait = self.age_min - age
+        over = income - self.income_max
+        distance = np.where(category_ok, 0.0, MISMATCH_DISTANCE)
+        distance += np.where(wait > 0, 1 + wait / COUNTERFACTUAL_AGE_YEARS, 0.0)
+        distance += np.where(over > 0, 1 + over / max(1, income), 0.0)
+        distance[age > self.age_max] = np.inf
+        return distance
+
+    def counterfactuals(self, citizen: dict, limit: int, within: int | None = None) -> list:
+        """
+        Up to `limit` (distance, scheme index) pairs for the schemes this
+        citizen misses but could still reach, nearest first (catalog order
+        within a distance). Numeric distances for the whole catalog come from
+        one pass over the rule vectors; a `where` is only evaluated for the
+        candidates that distance alone could still place in the top `limit`.
+        """
+        if limit <= 0:
+            return []
+        age, income, category = profile_values(citizen)
+        if self.vectorized:
+            distance = self.distances(age, income, category)
+            candidate = np.isfinite(distance) & ((distance > 0) | self.conditional_mask)
+            if within is not None:
+                scope = np.zeros(len(self), dtype=bool)
+                scope[bit_indices(within)] = True
+                candidate &= scope
+            order = np.flatnonzero(candidate)
+            order = order[np.argsort(distance[order], kind="stable")]
+            ranked = zip(order.tolist(), distance[order].tolist())
+        else:
+            scope = range(len(self)) if within is None else bit_indices(within)
+            pairs = [(j, eligibility_distance(self.rules[j], age, income, self.rules[j].category_ok(category)))
+                     for j in scope]
+            ranked = sorted(((j, d) for j, d in pairs if d < float("inf") and (d > 0 or self.rules[j].where_ok)),
+                            key=lambda p: p[1])
+        best = []
+        for j, lower in ranked:
+            if len(best) >= limit and lower > best[-1][0]:
+                break
+            where_ok = self.rules[j].where_ok
+            distance = lower + (MISMATCH_DISTANCE if where_ok and not where_ok(citizen) else 0)
+            if distance > 0:
+                insort(best, (distance, j))
+                del best[limit:]
+        return best
+
+    def result(self, citizen: dict, i: int, values: tuple | None = None) -> "EligibilityResult":
+        """Result record for scheme `i`; `values` is the citizen's profile_values, if already parsed."""
+        return EligibilityResult(self.schemes[i], self.rules[i], values or profile_values(citizen), citizen)
+
+
+# Catalog version (or digest of schemes sent by value) -> CompiledCatalog.
+# Room for the kept versions plus as many distinct by-value lists.
+_compiled_catalogs = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def schemes_digest(schemes: list) -> str:
+    """Content key for schemes sent by value, so identical lists share one CompiledCatalog."""
+    canonical = json.dumps(schemes, sort_keys=True, separators=(",", ":"), default=str)
+    return "value:" + hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def compiled_catalog(key: str, schemes: list) -> CompiledCatalog:
+    """The CompiledCatalog for a catalog version or `schemes_digest`, built once per key."""
+    with _compiled_lock:
+        if key in _compiled_catalogs:
+            _compiled_catalogs.move_to_end(key)
+            return _compiled_catalogs[key]
+    catalog = CompiledCatalog(schemes)
+    with _compiled_lock:
+        _compiled_catalogs[key] = catalog
+        while len(_compiled_catalogs) > 2 * CATALOG_SNAPSHOTS_KEPT:
+            _compiled_catalogs.popitem(last=False)
+    print(f"[Eligibility Agent] Compiled catalog {key}: {len(catalog)} schemes ({'numpy' if catalog.vectorized else 'python'})")
+    return catalog
+
+
+class EligibilityResult:
+    """
+    One citizen × scheme outcome, held as flags. Reason strings and scheme
+    text are only rendered by `reasons` / `to_dict`, i.e. for the results
+    that are actually sent back.
+    """
+    __slots__ = ("scheme", "rule", "age", "income", "category", "category_ok", "age_ok", "income_ok", "where_ok")
+
+    def __init__(self, scheme: dict, rule: SchemeRule, values: tuple, citizen: dict):
+        self.scheme, self.rule = scheme, rule
+        self.age, self.income, self.category = values
+        self.category_ok = rule.category_ok(self.category)
+        self.age_ok      = rule.age_ok(self.age)
+        self.income_ok   = rule.income_ok(self.income)
+        self.where_ok    = rule.where_ok(citizen) if rule.where_ok else None
+
+    @property
+    def passed(self) -> int:
+        return self.category_ok + self.age_ok + self.income_ok + bool(self.where_ok)
+
+    @property
+    def eligible(self) -> bool:
+        return self.passed == self.rule.checks
+
+    @property
+    def match_score(self) -> int:
+        return MATCH_SCORES[self.rule.checks][self.passed]
+
+    @property
+    def name(self) -> str:
+        return self.scheme.get("name")
+
+    def reasons(self) -> tuple:
+        """(reasons_pass, reasons_fail)"""
+        rule, category, age, income = self.rule, self.category, self.age, self.income
+        reasons_pass, reasons_fail = [], []
+
+        # Category check
+        if self.category_ok:
+            reasons_pass.append(f"Category '{category}' matches scheme")
+        else:
+            reasons_fail.append(f"Category '{category}' not in {rule.categories}")
+
+        # Age check
+        if self.age_ok:
+            reasons_pass.append(f"Age {age} within allowed range {rule.age_min}-{rule.age_max}")
+        else:
+            reasons_fail.append(f"Age {age} outside allowed range {rule.age_min}-{rule.age_max}")
+
+        # Income check
+        if self.income_ok:
+            reasons_pass.append(f"Income Rs.{income:,} within limit Rs.{rule.income_max:,}")
+        else:
+            reasons_fail.append(f"Income Rs.{income:,} exceeds limit Rs.{rule.income_max:,}")
+
+        # Other conditions (state, gender, land, documents, ...)
+        if self.where_ok is not None:
+            if self.where_ok:
+                reasons_pass.append(f"Meets scheme conditions: {describe_condition(rule.where)}")
+            else:
+                reasons_fail.append(f"Does not meet scheme conditions: {describe_condition(rule.where)}")
+        return reasons_pass, reasons_fail
+
+    def unmet(self) -> list:
+        """The scheme's requirements this citizen missed, without the citizen's own values."""
+        rule, out = self.rule, []
+        if not self.category_ok:
+            out.append(f"category must be one of {', '.join(rule.categories)}")
+        if not self.age_ok:
+            out.append(f"age must be {rule.age_min}-{rule.age_max}")
+        if not self.income_ok:
+            out.append(f"income must be at most Rs.{rule.income_max:,}")
+        if self.where_ok is False:
+            out.append(f"must meet: {describe_condition(rule.where)}")
+        return out
+
+    @property
+    def distance(self) -> float:
+        """How far this citizen is from eligibility (see eligibility_distance); 0 when eligible."""
+        distance = eligibility_distance(self.rule, self.age, self.income, self.category_ok)
+        return distance + (MISMATCH_DISTANCE if self.where_ok is False else 0)
+
+    def changes(self) -> list:
+        """The smallest profile change that would pass each failed check, from the rule's thresholds."""
+        rule, out = self.rule, []
+        if not self.age_ok and self.age > rule.age_max:
+            out.append({"field": "age", "max": rule.age_max, "reachable": False,
+                        "text": f"over the age limit of {rule.age_max}"})
+        elif not self.age_ok:
+            years = rule.age_min - self.age
+            out.append({"field": "age", "min": rule.age_min, "wait_years": years,
+                        "text": f"eligible in {years} year{'s' if years != 1 else ''} (minimum age {rule.age_min})"})
+        if not self.income_ok:
+            over = self.income - rule.income_max
+            out.append({"field": "income", "max": rule.income_max, "over_by": over,
+                        "text": f"income Rs.{over:,} over the Rs.{rule.income_max:,} limit"})
+        if not self.category_ok:
+            labels = [category_label(c) for c in rule.categories]
+            out.append({"field": "category", "one_of": rule.categories,
+                        "text": f"open to the {name_list(labels, 'or')} category"})
+        if self.where_ok is False:
+            out.append({"field": "conditions", "requires": describe_condition(rule.where),
+                        "text": f"requires {describe_condition(rule.where)}"})
+        return out
+
+    def to_dict(self) -> dict:
+        scheme = self.scheme
+        reasons_pass, reasons_fail = self.reasons()
+        return {
+            "scheme_id": scheme.get("id"),
+            "name": scheme.get("name"),
+            "category": scheme.get("category"),
+            "eligible": self.eligible,
+            "match_score": self.match_score,
+            "reasons_pass": reasons_pass,
+            "reasons_fail": reasons_fail,
+            "description": scheme.get("description"),
+            "benefits": scheme.get("benefits"),
+            "eligibility_text": scheme.get("eligibility_text"),
+        }
 
 
 def extract_data(content):
@@ -130,6 +864,113 @@ def extract_data(content):
     return data.get("citizen", data), data.get("schemes", [])
 
 
+def batch_row(catalog: CompiledCatalog, i: int, schemes, passed) -> dict:
+    """Sparse result for one citizen: eligible pairs, plus partial pairs with their score."""
+    eligible, partial = [], []
+    for j, p in zip(schemes, passed):
+        scheme_id, name = catalog.refs[j]
+        checks = catalog.rules[j].checks
+        ref = {"scheme_id": scheme_id, "name": name, "match_score": MATCH_SCORES[checks][p]}
+        (eligible if p == checks else partial).append(ref)
+    row = {"index": i, "eligible": eligible, "eligible_count": len(eligible)}
+    if partial:
+        row["partial"] = partial
+    return row
+
+
+def evaluate_batch(citizens: list, catalog: CompiledCatalog, explain: bool | str = False, min_score: int = 100,
+                   version: str | None = None, llm_budget_ms: int = BATCH_LLM_BUDGET_MS) -> tuple:
+    """
+    Evaluate a block of citizens against the catalog as one citizens × schemes
+    matrix, EVAL_CHUNK_CELLS pairs at a time. Only pairs scoring at least
+    `min_score` are returned (just the eligible ones by default); the second
+    value is the kernel's throughput stats.
+    """
+    t0 = time.perf_counter()
+    out = [None] * len(citizens)
+    valid, values = [], []
+    for i, citizen in enumerate(citizens):
+        try:
+            values.append(profile_values(citizen))
+            valid.append(i)
+        except (TypeError, ValueError) as e:
+            out[i] = {"index": i, "error": f"Invalid profile: {e}"}
+
+    # Fewest checks passed that still reaches min_score, per scheme. `where`
+    # predicates only run where the numeric checks leave that reachable.
+    need = {checks: next((p for p, score in enumerate(scores) if score >= min_score), checks + 1)
+            for checks, scores in MATCH_SCORES.items()}
+    min_passed = [need[r.checks] for r in catalog.rules]
+    floor = need[4] - 1
+    chunk = max(1, EVAL_CHUNK_CELLS // max(1, len(catalog)))
+    pairs = 0
+    for start in range(0, len(valid), chunk):
+        rows, block = valid[start:start + chunk], values[start:start + chunk]
+        if catalog.vectorized:
+            passed = catalog.evaluate_matrix(*zip(*block))
+            if catalog.conditional:
+                for r, i in enumerate(rows):
+                    catalog.apply_conditions(passed[r], citizens[i], floor)
+            ci, sj = np.nonzero(passed >= np.array(min_passed, dtype=np.int8))
+            scores = passed[ci, sj]
+            bounds = np.cumsum(np.bincount(ci, minlength=len(rows)))[:-1]
+            for i, schemes, passed_i in zip(rows, np.split(sj, bounds), np.split(scores, bounds)):
+                out[i] = batch_row(catalog, i, schemes.tolist(), passed_i.tolist())
+        else:
+            for i, v in zip(rows, block):
+                passed = catalog.evaluate(*v)
+                catalog.apply_conditions(passed, citizens[i], floor)
+                hits = [j for j, p in enumerate(passed) if p >= min_passed[j]]
+                out[i] = batch_row(catalog, i, hits, [passed[j] for j in hits])
+        pairs += sum(len(out[i]["eligible"]) + len(out[i].get("partial", ())) for i in rows)
+
+    elapsed = time.perf_counter() - t0
+    stats = {
+        "profiles":         len(citizens),
+        "errors":           len(citizens) - len(valid),
+        "schemes":          len(catalog),
+        "pairs":            pairs,
+        "chunk_rows":       chunk,
+        "vectorized":       catalog.vectorized,
+        "elapsed_ms":       round(elapsed * 1000, 1),
+        "profiles_per_sec": round(len(citizens) / elapsed) if elapsed > 0 else None,
+    }
+
+    # Template text per citizen; "llm" (or EXPLANATION_ENGINE=llm) asks the
+    # LLM instead, through the explanation cache. Cache misses go to the LLM
+    # pool together and are waited for up to `llm_budget_ms` in all; the
+    # citizens whose answer is not back (or empty) keep the template text.
+    if explain:
+        llm = (EXPLANATION_ENGINE if explain is True else explain) == "llm"
+        found, insights, pending = {}, {}, {}
+        for i in valid:
+            hits, near = catalog.lookup(citizens[i], partial_limit=3 if llm else 0)
+            eligible = [catalog.result(citizens[i], j) for j in hits[:5]]
+            if llm and _llm:
+                ineligible = [catalog.result(citizens[i], j) for j in near]
+                key = explanation_key(version, citizens[i], eligible, ineligible)
+                insights[i] = explanation_cache.get(key) if key else None
+                if not insights[i]:
+                    pending[_llm_pool.submit(explain_and_cache, key, version, citizens[i], eligible, ineligible)] = i
+            found[i] = eligible, len(hits)
+        if pending:
+            done, not_done = wait_futures(pending, timeout=max(0, llm_budget_ms) / 1000)
+            for future in not_done:
+                future.cancel()
+            for future in done:
+                insights[pending[future]] = None if future.exception() else future.result()
+            stats["llm"] = {"calls": len(pending), "dropped": len(not_done)}
+        for i in valid:
+            eligible, count = found[i]
+            insight = insights.get(i)
+            if not insight:
+                reachable = [catalog.result(citizens[i], j) for _, j in catalog.counterfactuals(citizens[i], 5)]
+                insight = template_explain_eligibility(eligible, reachable, count)
+            out[i]["llm_summary"] = insight.get("summary", "")
+            out[i]["llm_advice"] = insight.get("advice", "")
+    return out, stats
+
+
 def message_handler(message: AgentMessage, topic: str):
     print("[Eligibility Agent] Evaluating eligibility")
     citizen, schemes = extract_data(message.content)
@@ -139,39 +980,228 @@ def message_handler(message: AgentMessage, topic: str):
         except: pass
     if isinstance(data_raw, dict):
         data_raw = data_raw.get("metadata", data_raw)
-    return_all = data_raw.get("return_all", False) if isinstance(data_raw, dict) else False
+    if not isinstance(data_raw, dict):
+        data_raw = {}
+    # Follow-up fetch of an async explanation; `wait_ms` long-polls
+    if data_raw.get("request") == "explanation":
+        try:
+            wait_ms = int(data_raw.get("wait_ms") or 0)
+        except (TypeError, ValueError):
+            agent.set_response(message.message_id, json.dumps({"error": "wait_ms must be an integer"}))
+            return
+        job = explanation_jobs.status(str(data_raw.get("token", "")), wait_ms)
+        agent.set_response(message.message_id, json.dumps(job))
+        return
 
-    if not schemes:
-        agent.set_response(message.message_id, json.dumps([]))
+    return_all = data_raw.get("return_all", False)
+    explain    = data_raw.get("explain", True)  # True, "template", "llm", "async" or False
+    llm_budget = data_raw.get("llm_budget_ms")  # None = wait for the LLM as long as it takes
+    try:
+        llm_budget = None if llm_budget is None else int(llm_budget)
+    except (TypeError, ValueError):
+        agent.set_response(message.message_id, json.dumps({"error": "llm_budget_ms must be an integer"}))
         return
+    mode = (EXPLANATION_ENGINE if explain is True else explain) if explain else None
 
-    results = [check_scheme_eligibility(citizen, s) for s in schemes]
-    eligible = [r for r in results if r["eligible"]]
-    ineligible = [r for r in results if not r["eligible"]]
-    print(f"[Eligibility Agent] {len(eligible)}/{len(results)} eligible")
+    # Incremental re-evaluation: an evaluation requested with "handle": true
+    # returns an `evaluation_handle`; {"evaluation_handle": ..., "delta": {"income": 180000}}
+    # applies the delta to that evaluation's citizen and re-checks only the
+    # schemes the changed fields can affect, in the same catalog and scope.
+    previous = None
+    if data_raw.get("evaluation_handle"):
+        previous = evaluation_handles.get(str(data_raw["evaluation_handle"]))
+        if previous is None:
+            agent.set_response(message.message_id, json.dumps({"error": "Unknown or expired evaluation handle"}))
+            return
+        delta = data_raw.get("delta") if isinstance(data_raw.get("delta"), dict) else {}
+        citizen = {**previous[2], **delta}
 
-    # ── LLM: personalized explanation ────────────────────────────────────────
-    llm_insight = llm_explain_eligibility(citizen, eligible, ineligible)
-    if llm_insight:
-        print(f"[Eligibility Agent] LLM insight generated")
+    # Schemes by reference (catalog_version), or the Policy Agent's current catalog
+    version = data_raw.get("catalog_version")
+    if previous:
+        catalog, version = previous[0], previous[1]
+    elif schemes:
+        catalog = compiled_catalog(schemes_digest(schemes), schemes)
+    else:
+        # Without the snapshot there is nothing to evaluate against; the
+        # caller can resend the schemes by value.
+        try:
+            version, by_id = catalog_snapshots.get(version)
+        except CatalogUnavailable:
+            agent.set_response(message.message_id, json.dumps({"error": "catalog_unavailable", "catalog_version": version}))
+            return
+        catalog = compiled_catalog(version, list(by_id.values()))
 
+    # ── Batch mode: {"citizens": [...], "schemes": [...]} — no LLM unless asked ─
+    if isinstance(data_raw.get("citizens"), list):
+        try:
+            min_score = int(data_raw.get("min_score", 100))
+        except (TypeError, ValueError):
+            agent.set_response(message.message_id, json.dumps({"error": "min_score must be an integer"}))
+            return
+        batch, stats = evaluate_batch(data_raw["citizens"], catalog, explain=data_raw.get("explain", False),
+                                      min_score=min_score, version=version,
+                                      llm_budget_ms=BATCH_LLM_BUDGET_MS if llm_budget is None else llm_budget)
+        print(f"[Eligibility Agent] Batch of {len(batch)} citizens × {len(catalog)} schemes: "
+              f"{stats['pairs']} pairs in {stats['elapsed_ms']} ms ({stats['profiles_per_sec']} profiles/s)")
+        agent.set_response(message.message_id, json.dumps({"results": batch, "stats": stats, "catalog_version": version}))
+        return
+
+    # Candidates come from the catalog's bitset indexes; full results (with
+    # reason strings) are only built for the schemes that are returned.
+    # `partial_limit` asks for that many nearest misses as partial matches
+    # (by match_score); `counterfactual_limit` for that many missed schemes
+    # ranked by distance to eligibility, with the changes that would qualify.
+    ids = data_raw.get("scheme_ids")
+    within = catalog.bits_for(ids) if ids else None
+    limits = {}
+    for field in ("partial_limit", "counterfactual_limit"):
+        try:
+            limits[field] = int(data_raw.get(field) or 0)
+        except (TypeError, ValueError):
+            agent.set_response(message.message_id, json.dumps({"error": f"{field} must be an integer"}))
+            return
+    partial_limit, counterfactual_limit = limits["partial_limit"], limits["counterfactual_limit"]
+    try:
+        values = profile_values(citizen)
+    except (TypeError, ValueError) as e:
+        agent.set_response(message.message_id, json.dumps({"error": f"Invalid profile: {e}"}))
+        return
+    near_limit = max(partial_limit, 3 if mode in ("llm", "async") else 0)
+    diff = None
+    if previous:
+        _, _, before, within, before_bits = previous
+        eligible_bits, reevaluated = catalog.reevaluate(before, citizen, before_bits, within)
+        eligible_idx = bit_indices(eligible_bits)
+        near_idx = catalog.lookup(citizen, partial_limit=near_limit, within=within)[1] if near_limit else []
+        diff = {
+            "changed_fields":     sorted(f for f in delta if before.get(f) != delta[f]),
+            "reevaluated":        reevaluated,
+            "newly_eligible":     bit_indices(eligible_bits & ~before_bits),
+            "no_longer_eligible": bit_indices(before_bits & ~eligible_bits),
+        }
+    else:
+        eligible_idx, near_idx = catalog.lookup(citizen, partial_limit=near_limit, within=within)
+        eligible_bits = index_bits(eligible_idx)
+    # Result records hold flags only; reasons and scheme text are rendered
+    # when the payload is serialized.
     if return_all:
+        selected = bit_indices(within) if within is not None else range(len(catalog))
+        results = [catalog.result(citizen, j, values) for j in selected]
+        eligible = [r for r in results if r.eligible]
+        ineligible = [r for r in results if not r.eligible]
+        near = sorted(ineligible, key=lambda r: r.match_score, reverse=True)
+    else:
+        eligible = [catalog.result(citizen, j, values) for j in eligible_idx]
+        near = ineligible = [catalog.result(citizen, j, values) for j in near_idx]
+    nearest = catalog.counterfactuals(citizen, max(counterfactual_limit, 5 if explain else 0), within)
+    reachable = [(distance, catalog.result(citizen, j, values)) for distance, j in nearest]
+    total = len(catalog) if within is None else bin(within).count("1")
+    print(f"[Eligibility Agent] {len(eligible_idx)}/{total} eligible"
+          + (f" ({diff['reevaluated']} re-evaluated for {', '.join(diff['changed_fields']) or 'no change'})" if diff else ""))
+
+    # ── Explanation ──────────────────────────────────────────────────────────
+    # The template text is built from the rule outcomes and is always there;
+    # LLM prose is opt-in: "llm" waits for it within llm_budget_ms, "async"
+    # answers now with a token and the text is fetched or streamed later.
+    # Identical prompts are answered from the explanation cache.
+    insight = template_explain_eligibility(eligible, [r for _, r in reachable]) if mode else {}
+    enrichments = {"explanation": "template" if mode else "none"}
+    token = None
+    if mode in ("llm", "async"):
+        key = explanation_key(version, citizen, eligible, ineligible)
+        cached_insight = explanation_cache.get(key) if key else None
+        if cached_insight:
+            llm_insight, llm_status = cached_insight, "ok"
+        elif mode == "async":
+            llm_insight = None
+            if _llm:
+                token = explanation_jobs.submit(explain_and_cache, key, version, citizen, eligible[:5], ineligible[:3])
+                llm_status = "pending"
+            else:
+                llm_status = "unavailable"
+        else:
+            llm_insight, llm_status = run_llm_with_budget(_llm, _llm_pool, explain_and_cache, key, version, citizen, eligible, ineligible, budget_ms=llm_budget)
+        if llm_insight:
+            print(f"[Eligibility Agent] LLM insight generated")
+            insight, enrichments["explanation"] = llm_insight, "llm"
+        enrichments["llm_explanation"] = llm_status
+        if key:
+            enrichments["explanation_cache"] = "hit" if cached_insight else "miss"
+
+    counterfactuals = [{**r.to_dict(), "distance": round(distance, 3), "changes": r.changes()}
+                       for distance, r in reachable[:counterfactual_limit]]
+    # Handle for follow-up deltas, on request ("handle": true); a
+    # re-evaluation returns what changed
+    handle = evaluation_handles.put(catalog, version, citizen, within, eligible_bits) \
+        if data_raw.get("handle") and not data_raw.get("explain_only") else None
+    if diff:
+        for change in ("newly_eligible", "no_longer_eligible"):
+            diff[change] = [catalog.result(citizen, j, values).to_dict() for j in diff[change]]
+
+    if data_raw.get("explain_only"):
+        # Enrichment-only call: the orchestrator already has the deterministic results
+        payload = {
+            "llm_summary":     insight.get("summary", ""),
+            "llm_advice":      insight.get("advice", ""),
+            "enrichments":     enrichments,
+            "explanation_token": token,
+            "catalog_version": version,
+        }
+        agent.set_response(message.message_id, json.dumps(payload))
+    elif return_all:
         payload = {
-            "all_evaluated": results,
-            "llm_summary":   llm_insight.get("summary", ""),
-            "llm_advice":    llm_insight.get("advice", ""),
+            "all_evaluated":   [r.to_dict() for r in results],
+            "partial":         [r.to_dict() for r in near[:partial_limit]],
+            "counterfactuals": counterfactuals,
+            "evaluation_handle": handle,
+            "diff":            diff,
+            "llm_summary":     insight.get("summary", ""),
+            "llm_advice":      insight.get("advice", ""),
+            "enrichments":     enrichments,
+            "explanation_token": token,
+            "catalog_version": version,
         }
         agent.set_response(message.message_id, json.dumps(payload))
     else:
         payload = {
-            "eligible":    eligible,
-            "llm_summary": llm_insight.get("summary", ""),
-            "llm_advice":  llm_insight.get("advice", ""),
+            "eligible":        [r.to_dict() for r in eligible],
+            "partial":         [r.to_dict() for r in near[:partial_limit]],
+            "counterfactuals": counterfactuals,
+            "evaluation_handle": handle,
+            "diff":            diff,
+            "llm_summary":     insight.get("summary", ""),
+            "llm_advice":      insight.get("advice", ""),
+            "enrichments":     enrichments,
+            "explanation_token": token,
+            "catalog_version": version,
         }
         agent.set_response(message.message_id, json.dumps(payload))
 
 
-agent.add_message_handler(message_handler)
 
-while True:
-    time.sleep(60)
+
+def explanation_stream_handler(message: AgentMessage, topic: str):
+    """
+    Push channel for async explanations: POST {"token": ...} to
+    /webhook/stream and the explanation arrives as an NDJSON record once
+    it is ready, after a "pending" record if it was not ready yet.
+    """
+    content = message.content if isinstance(message.content, dict) else {}
+    payload = content.get("metadata") or content
+    token = str(payload.get("token", ""))
+    job = explanation_jobs.status(token)
+    if job["status"] == "pending":
+        yield {"type": "explanation", **job}
+        job = explanation_jobs.status(token, EXPLANATION_MAX_WAIT_MS)
+    yield {"type": "explanation", **job}
+
+
+if __name__ == "__main__":
+    agent.add_health_hook(lambda: {"explanations": {**explanation_jobs.stats(), "cache": explanation_cache.stats()},
+                                   "evaluations": evaluation_handles.stats()})
+    agent.add_message_handler(message_handler)
+    agent.add_stream_handler(explanation_stream_handler)
+
+    while True:
+        time.sleep(60)
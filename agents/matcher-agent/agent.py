@@ -1,8 +1,10 @@
 from zyndai_agent.agent import AgentConfig, ZyndAIAgent
 from zyndai_agent.message import AgentMessage
+from zyndai_agent.catalog import CatalogSnapshots, CatalogUnavailable
 from dotenv import load_dotenv
 from pathlib import Path
 import os, time, json
+from concurrent.futures import ThreadPoolExecutor, wait
 
 try:
     from openai import OpenAI as _OpenAI
@@ -14,8 +16,12 @@ env_path = Path(__file__).resolve().parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
 port = int(os.environ.get("PORT", 5003))
+# First URL when the orchestrator's setting lists several replicas.
+POLICY_AGENT_URL = os.environ.get("POLICY_AGENT_URL", "http://localhost:5001").split(",")[0].strip()
+CATALOG_SNAPSHOTS_KEPT = int(os.environ.get("CATALOG_SNAPSHOTS_KEPT", 3))
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 _llm = _OpenAI(api_key=OPENAI_API_KEY) if (_openai_available and OPENAI_API_KEY) else None
+_llm_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("LLM_WORKERS", 8)), thread_name_prefix="llm")
 
 
 def llm_why_scheme(citizen: dict, scheme: dict) -> str:
@@ -60,6 +66,13 @@ config = AgentConfig(
 agent = ZyndAIAgent(config)
 print(f"[Matcher Agent] Running on port {port} | ID: {agent.agent_id}")
 
+
+# ── Catalog snapshots (by-reference requests) ────────────────────────────────
+# Requests may carry only `catalog_version` + scheme ids; the schemes for that
+# version are fetched from the Policy Agent once and kept locally.
+catalog_snapshots = CatalogSnapshots(POLICY_AGENT_URL, agent.agent_id, "Matcher Agent", CATALOG_SNAPSHOTS_KEPT)
+
+
 # Category priority weights — higher = more priority
 CATEGORY_WEIGHTS = {
     "bpl": 10, "disabled": 9, "sc_st": 8, "senior_citizen": 8,
@@ -91,24 +104,66 @@ def compute_relevance(citizen: dict, scheme: dict) -> int:
     return min(100, base + boost + income_ratio_boost)
 
 
+def add_llm_why(citizen: dict, schemes: list, budget_ms: int | None = None) -> dict:
+    """
+    Attach `llm_why` to `schemes`, generating the sentences concurrently.
+
+    Sentences not ready within `budget_ms` are dropped so the ranking itself is
+    never held up. Returns a count of outcomes per status (ok / unavailable /
+    skipped / dropped).
+    """
+    if not schemes:
+        return {}
+    if not _llm:
+        return {"unavailable": len(schemes)}
+    if budget_ms is not None and budget_ms <= 0:
+        return {"skipped": len(schemes)}
+    futures = {_llm_pool.submit(llm_why_scheme, citizen, s): s for s in schemes}
+    done, not_done = wait(futures, timeout=None if budget_ms is None else budget_ms / 1000)
+    counts = {}
+    for fut in done:
+        why = fut.result()
+        if why:
+            futures[fut]["llm_why"] = why
+        status = "ok" if why else "unavailable"
+        counts[status] = counts.get(status, 0) + 1
+    for fut in not_done:
+        fut.cancel()
+    if not_done:
+        counts["dropped"] = len(not_done)
+    return counts
+
+
 def extract_data(content):
     if isinstance(content, str):
         try:
             content = json.loads(content)
         except Exception:
-            return {}, []
+            return {}, [], None, None
     data = content.get("metadata", content)
-    return data.get("citizen", {}), data.get("eligible_schemes", [])
+    return data.get("citizen", {}), data.get("eligible_schemes", []), data.get("catalog_version"), data.get("llm_budget_ms")
 
 
 def message_handler(message: AgentMessage, topic: str):
     print("[Matcher Agent] Ranking schemes")
-    citizen, eligible_schemes = extract_data(message.content)
+    citizen, eligible_schemes, version, llm_budget = extract_data(message.content)
 
     if not eligible_schemes:
         agent.set_response(message.message_id, json.dumps([]))
         return
 
+    # By-reference request: entries are {"scheme_id", "match_score"}; scheme text
+    # comes from the local catalog snapshot and only the ranking is sent back.
+    by_ref = bool(version)
+    if by_ref:
+        try:
+            _, by_id = catalog_snapshots.get(version)
+        except CatalogUnavailable:
+            agent.set_response(message.message_id, json.dumps({"error": "catalog_unavailable", "catalog_version": version}))
+            return
+        refs = eligible_schemes
+        eligible_schemes = [{**by_id.get(r.get("scheme_id"), {}), **r} for r in refs]
+
     scored = []
     for scheme in eligible_schemes:
         score = compute_relevance(citizen, scheme)
@@ -119,13 +174,15 @@ def message_handler(message: AgentMessage, topic: str):
         s["rank"] = i + 1
 
     # ── LLM: "why this scheme fits you" for top 5 ──────────────────────────
-    for s in ranked[:5]:
-        why = llm_why_scheme(citizen, s)
-        if why:
-            s["llm_why"] = why
+    why_status = add_llm_why(citizen, ranked[:5], budget_ms=llm_budget)
 
     print(f"  => Ranked {len(ranked)} schemes")
-    agent.set_response(message.message_id, json.dumps(ranked))
+    if by_ref:
+        keep = ("scheme_id", "relevance_score", "rank", "llm_why")
+        ranked = [{k: s[k] for k in keep if k in s} for s in ranked]
+        agent.set_response(message.message_id, json.dumps({"ranked": ranked, "enrichments": {"llm_why": why_status}}))
+    else:
+        agent.set_response(message.message_id, json.dumps(ranked))
 
 
 agent.add_message_handler(message_handler)
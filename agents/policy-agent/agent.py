@@ -1,8 +1,13 @@
 from zyndai_agent.agent import AgentConfig, ZyndAIAgent
 from zyndai_agent.message import AgentMessage
+from zyndai_agent.rules import RULES_COMPILER_VERSION, condition_text, with_compiled_rules
 from dotenv import load_dotenv
 from pathlib import Path
-import os, time, json
+import os, time, json, hashlib, threading, mmap
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from functools import cached_property
 
 env_path = Path(__file__).resolve().parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
@@ -10,6 +15,31 @@ load_dotenv(dotenv_path=env_path)
 port = int(os.environ.get("PORT", 5001))
 SUPABASE_URL = os.environ.get("SUPABASE_URL") or os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY")
+# Recent catalog versions kept so agents can fetch the exact snapshot a request refers to.
+CATALOG_SNAPSHOTS_KEPT = int(os.environ.get("CATALOG_SNAPSHOTS_KEPT", 3))
+# Seconds between background catalog reloads (0 loads once at startup only).
+CATALOG_REFRESH_INTERVAL = float(os.environ.get("CATALOG_REFRESH_INTERVAL", 60))
+# Change feed: seconds between polls for changed rows (Supabase `updated_at`
+# high-water mark, plus the NDJSON change log below if set). 0 disables it.
+CATALOG_CHANGES_INTERVAL = float(os.environ.get("CATALOG_CHANGES_INTERVAL", 5))
+# Each poll re-reads rows up to this many seconds behind the mark: updated_at
+# is stamped before a write commits, so a slow write can become visible only
+# after the mark has moved past it. Rows already seen are skipped.
+CATALOG_CHANGES_OVERLAP = float(os.environ.get("CATALOG_CHANGES_OVERLAP", 60))
+# Optional NDJSON change log (e.g. written by `scrape_schemes.py --changelog`),
+# a local stand-in for the Supabase feed, so only used when Supabase is not
+# configured. The latest entry per scheme is applied on top of every full load.
+CATALOG_CHANGELOG = os.environ.get("CATALOG_CHANGELOG", "")
+# `query_schemes` requests run as SQL on Supabase (falling back to filtering
+# the in-memory snapshot); set to 0 to always filter the snapshot.
+CATALOG_QUERY_PUSHDOWN = os.environ.get("CATALOG_QUERY_PUSHDOWN", "1") == "1"
+CATALOG_QUERY_LIMIT    = int(os.environ.get("CATALOG_QUERY_LIMIT", 500))
+# Default and maximum page size for paginated catalog requests.
+CATALOG_PAGE_SIZE = int(os.environ.get("CATALOG_PAGE_SIZE", 500))
+# Last catalog loaded from Supabase, kept on disk for instant cold starts
+# and for outages (set to an empty string to disable).
+CATALOG_SNAPSHOT_FILE = os.environ.get(
+    "CATALOG_SNAPSHOT_FILE", str(Path(__file__).resolve().parent / "catalog.snapshot.ndjson"))
 
 config = AgentConfig(
     name="Policy Agent",
@@ -98,46 +128,609 @@ SCHEMES_FALLBACK = [
 ]
 
 
-def fetch_schemes_from_supabase() -> list:
+_sb = None
+
+
+def fetch_schemes_from_supabase() -> list | None:
+    """Active schemes from Supabase; [] if it is not configured, None if the load failed."""
+    global _sb
     if not SUPABASE_URL or not SUPABASE_KEY:
         return []
     try:
-        from supabase import create_client
-        sb = create_client(SUPABASE_URL, SUPABASE_KEY)
-        result = sb.table("schemes").select("*").eq("is_active", True).execute()
+        if _sb is None:
+            from supabase import create_client
+            _sb = create_client(SUPABASE_URL, SUPABASE_KEY)
+        result = _sb.table("schemes").select("*").eq("is_active", True).execute()
         rows = result.data or []
         if not rows:
             return []
-        normalized = []
-        for row in rows:
-            rules = row.get("rules", {})
-            if isinstance(rules, str):
-                try:
-                    rules = json.loads(rules)
-                except Exception:
-                    rules = {}
-            normalized.append({
-                "id": row.get("id"), "name": row.get("name"), "category": row.get("category"),
-                "description": row.get("description"), "benefits": row.get("benefits"),
-                "eligibility_text": row.get("eligibility_text"), "rules": rules,
-                "ministry": row.get("ministry", ""), "official_url": row.get("official_url", ""),
-            })
+        stamps = [r["updated_at"] for r in rows if r.get("updated_at")]
+        _change_marks["updated_at"] = max(stamps, key=datetime.fromisoformat, default=None)
+        _changes_seen.clear()
+        _changes_seen.update((r.get("id"), r.get("updated_at")) for r in rows if r.get("updated_at"))
+        normalized = [normalize_row(row) for row in rows]
         print(f"[Policy Agent] Loaded {len(normalized)} schemes from Supabase")
         return normalized
     except Exception as e:
-        print(f"[Policy Agent] Supabase unavailable, using fallback: {e}")
+        print(f"[Policy Agent] Supabase unavailable: {e}")
+        return None
+
+
+def normalize_row(row: dict) -> dict:
+    rules = row.get("rules", {})
+    if isinstance(rules, str):
+        try:
+            rules = json.loads(rules)
+        except Exception:
+            rules = {}
+    return {
+        "id": row.get("id"), "name": row.get("name"), "category": row.get("category"),
+        "description": row.get("description"), "benefits": row.get("benefits"),
+        "eligibility_text": row.get("eligibility_text"), "rules": rules,
+        "ministry": row.get("ministry", ""), "official_url": row.get("official_url", ""),
+        "source": row.get("source") or "builtin", "state_specific": bool(row.get("state_specific", False)),
+    }
+
+
+def rule_report(schemes) -> dict:
+    ignored, invalid = {}, []
+    for s in schemes:
+        compiled = s["compiled_rules"]
+        for key in compiled["ignored"]:
+            ignored[key] = ignored.get(key, 0) + 1
+        if compiled["errors"]:
+            invalid.append({"id": s.get("id"), "errors": compiled["errors"]})
+    return {"compiler_version": RULES_COMPILER_VERSION, "ignored_keys": ignored, "invalid": invalid}
+
+
+def scheme_hash(scheme: dict) -> int:
+    canonical = json.dumps(scheme, sort_keys=True, separators=(",", ":"), default=str)
+    return int.from_bytes(hashlib.sha256(canonical.encode()).digest()[:8], "big")
+
+
+def catalog_version(hashes) -> str:
+    """
+    Content hash of the catalog — changes whenever any scheme changes. It is
+    the XOR of per-scheme hashes, so applying a change only touches the
+    hashes of the rows involved.
+    """
+    acc = 0
+    for h in hashes:
+        acc ^= h
+    return f"{acc:016x}"
+
+
+def extract_request(content) -> dict:
+    if isinstance(content, str):
+        try:
+            content = json.loads(content)
+        except Exception:
+            return {}
+    if isinstance(content, dict):
+        return content.get("metadata", content)
+    return {}
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """
+    One immutable catalog version. The full-catalog response is serialized
+    the first time it is asked for and then reused; pages and the NDJSON
+    stream serialize only the schemes they send.
+    """
+    version: str
+    schemes: tuple
+    source: str         # "supabase" or "fallback"
+    loaded_at: float
+    version_body: str   # {"version", "count"} response
+    hashes: dict        # scheme id -> scheme_hash, for incremental versions
+    rule_report: dict   # rule keys the compiler ignored or rejected
+
+    @cached_property
+    def body(self) -> str:
+        """{"version", "schemes"} response."""
+        return json.dumps({"version": self.version, "schemes": list(self.schemes)})
+
+    @classmethod
+    def build(cls, schemes: list, source: str, hashes: dict | None = None) -> "CatalogSnapshot":
+        schemes = [with_compiled_rules(s) for s in schemes]
+        if hashes is None:
+            hashes = {s.get("id"): scheme_hash(s) for s in schemes}
+        version = catalog_version(hashes.values())
+        return cls(
+            version=version, schemes=tuple(schemes), source=source, loaded_at=time.time(),
+            version_body=json.dumps({"version": version, "count": len(schemes)}),
+            hashes=hashes, rule_report=rule_report(schemes),
+        )
+
+    def apply(self, changes: list) -> "CatalogSnapshot":
+        """
+        New snapshot with `(op, scheme_id, scheme)` changes applied: "upsert"
+        replaces or adds the scheme, "delete" removes it. Only the changed rows
+        are re-hashed; the other schemes are shared with this snapshot.
+        """
+        by_id = {s.get("id"): s for s in self.schemes}
+        hashes = dict(self.hashes)
+        for op, sid, scheme in changes:
+            if op == "upsert":
+                scheme = with_compiled_rules(scheme)
+                by_id[sid] = scheme
+                hashes[sid] = scheme_hash(scheme)
+            else:
+                by_id.pop(sid, None)
+                hashes.pop(sid, None)
+        return CatalogSnapshot.build(list(by_id.values()), self.source, hashes)
+
+
+_snapshots = OrderedDict()  # version -> CatalogSnapshot
+_snapshots_lock = threading.Lock()
+
+
+def remember_snapshot(snapshot: CatalogSnapshot) -> None:
+    with _snapshots_lock:
+        _snapshots[snapshot.version] = snapshot
+        _snapshots.move_to_end(snapshot.version)
+        while len(_snapshots) > CATALOG_SNAPSHOTS_KEPT:
+            _snapshots.popitem(last=False)
+
+
+# The snapshot every request is served from. Replaced wholesale by
+# `refresh_catalog` and `poll_changes` (under `_swap_lock`), so readers always
+# see one complete version.
+_current = None
+_swap_lock = threading.Lock()
+_refresh_stats = {"refreshes": 0, "swaps": 0, "failures": 0, "last_error": None, "last_success": None}
+
+# Change feed position: Supabase `updated_at` high-water mark (set by every
+# full load) and byte offset into CATALOG_CHANGELOG.
+_change_marks = {"updated_at": None, "offset": 0}
+_changelog = {}  # scheme id -> (at, change): latest CATALOG_CHANGELOG entry per scheme
+_changes_seen = set()  # (scheme id, updated_at) of rows applied within the overlap window
+_change_stats = {"polls": 0, "changes_applied": 0, "failures": 0, "last_error": None}
+
+
+def read_changelog() -> list:
+    """
+    New `(op, scheme_id, scheme)` entries appended to CATALOG_CHANGELOG since
+    the last read, recorded in `_changelog`. An entry older (by `at`) than
+    one already read for the same scheme is skipped.
+    """
+    if not CATALOG_CHANGELOG or (SUPABASE_URL and SUPABASE_KEY) or not os.path.exists(CATALOG_CHANGELOG):
         return []
+    changes = []
+    with open(CATALOG_CHANGELOG, "rb") as f:
+        if os.fstat(f.fileno()).st_size < _change_marks["offset"]:
+            _change_marks["offset"] = 0  # log was truncated or rotated
+        f.seek(_change_marks["offset"])
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # partially written entry; picked up next time
+            _change_marks["offset"] += len(line)
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            scheme = entry.get("scheme") or {}
+            sid = scheme.get("id") or entry.get("id")
+            if not sid:
+                continue
+            at = str(entry.get("at") or "")
+            if sid in _changelog and at < _changelog[sid][0]:
+                continue
+            if entry.get("op") == "delete" or scheme.get("is_active") is False:
+                change = ("delete", sid, None)
+            else:
+                change = ("upsert", sid, normalize_row(scheme))
+            _changelog[sid] = (at, change)
+            changes.append(change)
+    return changes
 
 
-def message_handler(message: AgentMessage, topic: str):
+def poll_supabase_changes() -> list:
+    """
+    Rows inserted, updated or deactivated since the `updated_at` high-water
+    mark, less CATALOG_CHANGES_OVERLAP; rows already applied are skipped.
+    """
+    if _sb is None or _change_marks["updated_at"] is None:
+        return []
+    since = datetime.fromisoformat(_change_marks["updated_at"]) - timedelta(seconds=CATALOG_CHANGES_OVERLAP)
+    result = (_sb.table("schemes").select("*")
+              .gte("updated_at", since.isoformat()).order("updated_at").execute())
+    changes, seen, mark = [], set(), _change_marks["updated_at"]
+    for row in result.data or []:
+        key = (row.get("id"), row.get("updated_at"))
+        if key in _changes_seen or key in seen:
+            continue
+        if row.get("is_active") is False:
+            changes.append(("delete", row.get("id"), None))
+        else:
+            changes.append(("upsert", row.get("id"), normalize_row(row)))
+        if key[1]:
+            seen.add(key)
+            if datetime.fromisoformat(key[1]) > datetime.fromisoformat(mark):
+                mark = key[1]
+    # Forget rows that have left the next poll's window; they cannot be read again
+    _changes_seen.update(seen)
+    _change_marks["updated_at"] = mark
+    since = datetime.fromisoformat(mark) - timedelta(seconds=CATALOG_CHANGES_OVERLAP)
+    _changes_seen.difference_update([k for k in _changes_seen if datetime.fromisoformat(k[1]) < since])
+    return changes
+
+
+def poll_changes() -> int:
+    """Apply changed rows from the change feed to the current snapshot."""
+    global _current
+    with _swap_lock:
+        _change_stats["polls"] += 1
+        try:
+            changes = poll_supabase_changes() + read_changelog()
+        except Exception as e:
+            _change_stats["failures"] += 1
+            _change_stats["last_error"] = str(e)
+            return 0
+        if not changes:
+            return 0
+        snapshot = _current.apply(changes)
+        _change_stats["changes_applied"] += len(changes)
+        if snapshot.version != _current.version:
+            remember_snapshot(snapshot)
+            _current = snapshot
+            _refresh_stats["swaps"] += 1
+            print(f"[Policy Agent] Applied {len(changes)} change(s) → catalog {snapshot.version} ({len(snapshot.schemes)} schemes)")
+            save_snapshot_file(snapshot)
+        return len(changes)
+
+
+def _changes_loop() -> None:
+    while True:
+        time.sleep(CATALOG_CHANGES_INTERVAL)
+        poll_changes()
+
+
+# ── On-disk snapshot ─────────────────────────────────────────────────────────
+# NDJSON: a header line, then one compact scheme per line. Read through mmap
+# line by line and replaced atomically (write temp file, fsync, rename), so a
+# crash mid-write never leaves a torn snapshot behind.
+SNAPSHOT_FORMAT = "policy-catalog/1"
+
+
+def save_snapshot_file(snapshot: CatalogSnapshot) -> None:
+    if not CATALOG_SNAPSHOT_FILE or snapshot.source == "fallback":
+        return  # the fallback ships with the code; nothing worth persisting
+    tmp = f"{CATALOG_SNAPSHOT_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "format": SNAPSHOT_FORMAT, "version": snapshot.version, "count": len(snapshot.schemes),
+                "source": snapshot.source, "loaded_at": snapshot.loaded_at,
+            }) + "\n")
+            for scheme in snapshot.schemes:
+                f.write(json.dumps(scheme, separators=(",", ":"), default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, CATALOG_SNAPSHOT_FILE)
+    except OSError as e:
+        print(f"[Policy Agent] Could not write catalog snapshot file: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def load_snapshot_file() -> CatalogSnapshot | None:
+    """The catalog saved by `save_snapshot_file`, or None if missing or damaged."""
+    if not CATALOG_SNAPSHOT_FILE or not os.path.exists(CATALOG_SNAPSHOT_FILE):
+        return None
+    try:
+        with open(CATALOG_SNAPSHOT_FILE, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header = json.loads(mm.readline())
+            if header.get("format") != SNAPSHOT_FORMAT:
+                raise ValueError(f"unknown format {header.get('format')!r}")
+            schemes = [json.loads(line) for line in iter(mm.readline, b"")]
+        # Checked against the rows as stored: recompiling first would change
+        # the hashes whenever RULES_COMPILER_VERSION has moved on since.
+        hashes = {s.get("id"): scheme_hash(s) for s in schemes}
+        if catalog_version(hashes.values()) != header.get("version"):
+            raise ValueError("content does not match the recorded version (corrupt file)")
+        stale = sum((s.get("compiled_rules") or {}).get("v") != RULES_COMPILER_VERSION for s in schemes)
+        if stale:
+            print(f"[Policy Agent] Catalog snapshot file has rules from an older compiler; recompiling {stale} scheme(s)")
+            snapshot = CatalogSnapshot.build(schemes, "disk")
+        else:
+            snapshot = CatalogSnapshot.build(schemes, "disk", hashes)
+        return replace(snapshot, loaded_at=header.get("loaded_at") or snapshot.loaded_at)
+    except Exception as e:
+        print(f"[Policy Agent] Ignoring catalog snapshot file: {e}")
+        return None
+
+
+def load_catalog() -> CatalogSnapshot | None:
+    """
+    Snapshot from Supabase, or the hardcoded fallback. Returns None when
+    Supabase is configured but unreachable, so the caller can keep serving
+    what it has.
+    """
     schemes = fetch_schemes_from_supabase()
-    if not schemes:
+    if schemes is None:
+        return None
+    if schemes:
+        snapshot = CatalogSnapshot.build(schemes, "supabase")
+    else:
         print(f"[Policy Agent] Using hardcoded fallback ({len(SCHEMES_FALLBACK)} schemes)")
-        schemes = SCHEMES_FALLBACK
-    agent.set_response(message.message_id, json.dumps(schemes))
+        snapshot = CatalogSnapshot.build(SCHEMES_FALLBACK, "fallback")
+    read_changelog()
+    changes = [change for _, change in _changelog.values()]
+    return snapshot.apply(changes) if changes else snapshot
+
+
+def refresh_catalog() -> CatalogSnapshot:
+    """Reload the catalog and swap it in; on failure keep the current snapshot."""
+    global _current
+    with _swap_lock:
+        _refresh_stats["refreshes"] += 1
+        marks = dict(_change_marks)
+        try:
+            snapshot = load_catalog()
+            if snapshot is None:
+                raise RuntimeError("Supabase unavailable")
+        except Exception as e:
+            _change_marks.update(marks)
+            _refresh_stats["failures"] += 1
+            _refresh_stats["last_error"] = str(e)
+            if _current is not None:
+                print(f"[Policy Agent] Catalog refresh failed, still serving {_current.version}: {e}")
+                return _current
+            snapshot = CatalogSnapshot.build(SCHEMES_FALLBACK, "fallback")
+        else:
+            _refresh_stats["last_success"] = time.time()
+        if _current is None or snapshot.version != _current.version:
+            remember_snapshot(snapshot)
+            _current = snapshot
+            _refresh_stats["swaps"] += 1
+            print(f"[Policy Agent] Serving catalog {snapshot.version} ({len(snapshot.schemes)} schemes, {snapshot.source})")
+            report = snapshot.rule_report
+            if report["ignored_keys"] or report["invalid"]:
+                print(f"[Policy Agent] Rules: {len(report['ignored_keys'])} key(s) not evaluated, "
+                      f"{len(report['invalid'])} scheme(s) with invalid values")
+            save_snapshot_file(snapshot)
+        return _current
+
+
+def _refresh_loop() -> None:
+    while True:
+        time.sleep(CATALOG_REFRESH_INTERVAL)
+        refresh_catalog()
+
+
+def catalog_stats() -> dict:
+    snapshot = _current
+    return {
+        "version": snapshot.version, "count": len(snapshot.schemes), "source": snapshot.source,
+        "age_seconds": round(time.time() - snapshot.loaded_at, 1),
+        "refresh_interval": CATALOG_REFRESH_INTERVAL, **_refresh_stats,
+        "change_feed": {**_change_stats, "interval": CATALOG_CHANGES_INTERVAL, **_change_marks},
+        "rules": snapshot.rule_report,
+    }
+
+
+def catalog_health() -> dict:
+    """Catalog freshness for GET /health."""
+    snapshot = _current
+    if snapshot is None:
+        return {"catalog": None}
+    last_success = _refresh_stats["last_success"]
+    file_age = None
+    if CATALOG_SNAPSHOT_FILE and os.path.exists(CATALOG_SNAPSHOT_FILE):
+        file_age = round(time.time() - os.path.getmtime(CATALOG_SNAPSHOT_FILE), 1)
+    return {"catalog": {
+        "version": snapshot.version, "count": len(snapshot.schemes), "source": snapshot.source,
+        "age_seconds": round(time.time() - snapshot.loaded_at, 1),
+        "last_refresh_seconds_ago": round(time.time() - last_success, 1) if last_success else None,
+        "snapshot_file_age_seconds": file_age,
+    }}
+
+
+# ── Scheme queries ───────────────────────────────────────────────────────────
+# Age and income use the compiled rules, like the Eligibility Agent (and the
+# `query_schemes` SQL function in supabase/schema.sql).
+
+def parse_query(payload: dict) -> dict:
+    """Filters from a `query_schemes` request; raises ValueError on bad values."""
+    q = payload.get("query") or payload
+    filters = {}
+    for key in ("category", "state", "source", "text"):
+        value = q.get(key)
+        if isinstance(value, str) and value.strip():
+            filters[key] = value.strip()
+    for key in ("age", "income"):
+        if q.get(key) not in (None, ""):
+            try:
+                filters[key] = float(q[key])
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} must be a number")
+    if q.get("state_specific") is not None:
+        filters["state_specific"] = q["state_specific"] in (True, "true", "1", 1)
+    return filters
+
+
+def query_supabase(filters: dict, limit: int) -> list | None:
+    """
+    Run the query as the indexed `query_schemes` SQL function; None if
+    unavailable. Rows come back in the same shape as snapshot schemes,
+    `compiled_rules` included.
+    """
+    if _sb is None:
+        return None
+    params = {f"p_{key}": value for key, value in filters.items()}
+    params["p_limit"] = limit
+    try:
+        rows = _sb.rpc("query_schemes", params).execute().data or []
+    except Exception as e:
+        print(f"[Policy Agent] Query pushdown failed, filtering snapshot: {e}")
+        return None
+    return [with_compiled_rules(normalize_row(row)) for row in rows]
+
+
+def scheme_states(rules: dict) -> list:
+    """A scheme's `states` rule as compared by state queries (one state may be given as a string)."""
+    states = rules.get("states") or []
+    return [condition_text(x) for x in ([states] if isinstance(states, (str, int, float)) else states)]
+
+
+def query_snapshot(snapshot: CatalogSnapshot, filters: dict, limit: int) -> list:
+    """
+    Filter the in-memory snapshot. Keep in step with the `query_schemes` SQL
+    function, which must return the same schemes in the same order.
+    """
+    terms = filters["text"].lower().split() if "text" in filters else []
+    state = condition_text(filters.get("state", ""))
+    matches = []
+    for s in snapshot.schemes:
+        rules, compiled = s.get("rules") or {}, s["compiled_rules"]
+        if "category" in filters and s.get("category") != filters["category"]:
+            continue
+        if "source" in filters and (s.get("source") or "builtin") != filters["source"]:
+            continue
+        if "state_specific" in filters and bool(s.get("state_specific")) != filters["state_specific"]:
+            continue
+        if state and s.get("state_specific") and state not in scheme_states(rules):
+            continue
+        if "age" in filters and not (compiled["age_min"] <= filters["age"] <= compiled["age_max"]):
+            continue
+        if "income" in filters and filters["income"] > compiled["income_max"]:
+            continue
+        if terms:
+            text = " ".join(str(s.get(k) or "") for k in ("name", "description", "eligibility_text")).lower()
+            if not all(t in text for t in terms):
+                continue
+        matches.append(s)
+    matches.sort(key=lambda s: str(s.get("id")))
+    return matches[:limit]
+
+
+# ── Paginated and streamed catalog ───────────────────────────────────────────
+# Cursors pin the catalog version they started on, so a client paging
+# through never mixes two versions; once that version is no longer kept the
+# cursor expires and the client starts over.
+
+def catalog_page(payload: dict, current: CatalogSnapshot) -> dict:
+    size = max(1, min(int(payload.get("page_size") or CATALOG_PAGE_SIZE), CATALOG_PAGE_SIZE))
+    cursor = payload.get("cursor")
+    snapshot, offset = current, 0
+    if cursor:
+        version, _, pos = str(cursor).partition(":")
+        with _snapshots_lock:
+            snapshot = _snapshots.get(version)
+        if snapshot is None or not pos.isdigit():
+            return {"error": "cursor expired", "version": current.version}
+        offset = int(pos)
+    end = offset + size
+    return {
+        "version": snapshot.version, "count": len(snapshot.schemes),
+        "schemes": list(snapshot.schemes[offset:end]),
+        "next_cursor": f"{snapshot.version}:{end}" if end < len(snapshot.schemes) else None,
+    }
+
+
+def catalog_stream_handler(message: AgentMessage, topic: str):
+    """
+    POST /webhook/stream — the catalog as NDJSON: a `catalog` header, one
+    `scheme` record per scheme, then `end`. Accepts the same `version` and
+    `if_none_match` fields as the sync requests.
+    """
+    payload = extract_request(message.content)
+    snapshot = _current
+    if payload.get("version"):
+        with _snapshots_lock:
+            snapshot = _snapshots.get(payload["version"], snapshot)
+    if payload.get("if_none_match") and payload["if_none_match"] == snapshot.version:
+        yield {"type": "catalog", "status": "not_modified", "version": snapshot.version}
+        return
+    yield {"type": "catalog", "version": snapshot.version, "count": len(snapshot.schemes)}
+    for scheme in snapshot.schemes:
+        yield {"type": "scheme", "scheme": scheme}
+    yield {"type": "end", "version": snapshot.version, "count": len(snapshot.schemes)}
+
+
+def message_handler(message: AgentMessage, topic: str):
+    payload = extract_request(message.content)
+    request = payload.get("request", "get_all_schemes")
+    snapshot = _current
+
+    if request == "stats":
+        agent.set_response(message.message_id, json.dumps({"catalog": catalog_stats()}))
+        return
+
+    if request == "query_schemes":
+        try:
+            filters = parse_query(payload)
+            limit = max(1, min(int(payload.get("limit", CATALOG_QUERY_LIMIT)), CATALOG_QUERY_LIMIT))
+        except (TypeError, ValueError) as e:
+            agent.set_response(message.message_id, json.dumps({"error": str(e)}))
+            return
+        schemes = query_supabase(filters, limit) if CATALOG_QUERY_PUSHDOWN else None
+        pushdown = schemes is not None
+        version = snapshot.version
+        if schemes is None:
+            schemes = query_snapshot(snapshot, filters, limit)
+        elif any(snapshot.hashes.get(s.get("id")) != scheme_hash(s) for s in schemes):
+            version = None  # live rows that differ from the snapshot being served
+        agent.set_response(message.message_id, json.dumps({
+            "version": version, "filters": filters, "count": len(schemes),
+            "pushdown": pushdown, "schemes": schemes,
+        }))
+        return
+
+    # Conditional requests: a caller that already holds the version it would
+    # get back receives a small "not_modified" reply instead of the body.
+    if_none_match = payload.get("if_none_match")
+
+    if request == "get_snapshot":
+        with _snapshots_lock:
+            kept = _snapshots.get(payload.get("version"))
+        if kept is not None:
+            if if_none_match == kept.version:
+                agent.set_response(message.message_id, json.dumps({"status": "not_modified", "version": kept.version}))
+            else:
+                agent.set_response(message.message_id, kept.body)
+            return
+
+    if if_none_match and if_none_match == snapshot.version:
+        agent.set_response(message.message_id, json.dumps({"status": "not_modified", "version": snapshot.version}))
+    elif request == "catalog_version":
+        agent.set_response(message.message_id, snapshot.version_body)
+    elif payload.get("cursor") or payload.get("page_size"):
+        try:
+            page = catalog_page(payload, snapshot)
+        except (TypeError, ValueError) as e:
+            page = {"error": str(e)}
+        agent.set_response(message.message_id, json.dumps(page))
+    else:
+        # get_all_schemes, or get_snapshot for a version that is no longer kept
+        agent.set_response(message.message_id, snapshot.body)
+
 
+# Serve the on-disk snapshot straight away and reconcile with Supabase in the
+# background; without one, load once before serving. Afterwards requests
+# never wait on Supabase.
+if __name__ == "__main__":
+    if CATALOG_CHANGELOG and SUPABASE_URL and SUPABASE_KEY:
+        print(f"[Policy Agent] Supabase is configured; ignoring change log {CATALOG_CHANGELOG}")
+    _current = load_snapshot_file()
+    if _current is not None:
+        remember_snapshot(_current)
+        print(f"[Policy Agent] Serving catalog {_current.version} from {CATALOG_SNAPSHOT_FILE} ({len(_current.schemes)} schemes)")
+        threading.Thread(target=refresh_catalog, daemon=True, name="catalog-reconcile").start()
+    else:
+        refresh_catalog()
+    if CATALOG_REFRESH_INTERVAL > 0:
+        threading.Thread(target=_refresh_loop, daemon=True, name="catalog-refresh").start()
+    if CATALOG_CHANGES_INTERVAL > 0:
+        threading.Thread(target=_changes_loop, daemon=True, name="catalog-changes").start()
 
-agent.add_message_handler(message_handler)
+    agent.add_health_hook(catalog_health)
+    agent.add_message_handler(message_handler)
+    agent.add_stream_handler(catalog_stream_handler)
 
-while True:
-    time.sleep(60)
+    while True:
+        time.sleep(60)
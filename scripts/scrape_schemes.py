@@ -17,6 +17,7 @@ Usage:
   python scripts/scrape_schemes.py --source builtin        # only built-in data
   python scripts/scrape_schemes.py --dry-run               # print, don't save
   python scripts/scrape_schemes.py --limit 20              # cap per source
+  python scripts/scrape_schemes.py --changelog changes.ndjson  # also append to a change log
 
 Requirements:
   pip install requests beautifulsoup4 python-dotenv supabase
@@ -813,6 +814,23 @@ def upsert_to_supabase(schemes: list[dict], dry_run: bool = False) -> dict:
     return {"ok": len(errors) == 0, "count": total_ok, "errors": errors}
 
 
+def append_changelog(path: str, schemes: list[dict]) -> int:
+    """
+    Append one NDJSON `{"op": "upsert", "scheme": ...}` entry per scheme to
+    `path`. The Policy Agent tails this file (CATALOG_CHANGELOG) as a local
+    stand-in for the Supabase change feed.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    with open(path, "a", encoding="utf-8") as f:
+        for s in schemes:
+            scheme = {k: s.get(k) for k in (
+                "id", "name", "category", "description", "benefits", "eligibility_text",
+                "rules", "ministry", "official_url")}
+            f.write(json.dumps({"op": "upsert", "scheme": scheme, "at": now}, ensure_ascii=False) + "\n")
+    print(f"  ✓ Appended {len(schemes)} entries to change log {path}")
+    return len(schemes)
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Main
 # ─────────────────────────────────────────────────────────────────────────────
@@ -828,6 +846,8 @@ def main():
                         help="Print results without saving to Supabase")
     parser.add_argument("--json-output", action="store_true",
                         help="Output scraped schemes as JSON to stdout (for API use, skips DB write)")
+    parser.add_argument("--changelog", metavar="PATH",
+                        help="Also append upserted schemes to this NDJSON change log (Policy Agent CATALOG_CHANGELOG)")
     args = parser.parse_args()
 
     # In JSON output mode, redirect ALL progress prints to stderr BEFORE any
@@ -876,6 +896,8 @@ def main():
 
     # Upsert
     result = upsert_to_supabase(unique, dry_run=args.dry_run)
+    if args.changelog and not args.dry_run:
+        append_changelog(args.changelog, unique)
 
     if result.get("ok"):
         print(f"\n🎉 Done! {result['count']} schemes {'would be ' if args.dry_run else ''}saved.")
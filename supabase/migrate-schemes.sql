@@ -7,6 +7,7 @@
 ALTER TABLE schemes ADD COLUMN IF NOT EXISTS source         text DEFAULT 'builtin';
 ALTER TABLE schemes ADD COLUMN IF NOT EXISTS state_specific boolean NOT NULL DEFAULT false;
 ALTER TABLE schemes ADD COLUMN IF NOT EXISTS scraped_at     timestamptz;
+ALTER TABLE schemes ADD COLUMN IF NOT EXISTS updated_at     timestamptz NOT NULL DEFAULT now();
 
 -- Update existing rows to have source = 'builtin'
 UPDATE schemes SET source = 'builtin' WHERE source IS NULL;
@@ -15,6 +16,23 @@ UPDATE schemes SET source = 'builtin' WHERE source IS NULL;
 CREATE INDEX IF NOT EXISTS schemes_source_idx       ON schemes(source);
 CREATE INDEX IF NOT EXISTS schemes_category_idx     ON schemes(category);
 CREATE INDEX IF NOT EXISTS schemes_state_specific_idx ON schemes(state_specific);
+CREATE INDEX IF NOT EXISTS schemes_updated_at_idx   ON schemes(updated_at);
+
+-- Change feed: the Policy Agent polls rows whose updated_at passed its high-water
+-- mark (less an overlap window). clock_timestamp() is the time of the write, not
+-- the start of its transaction.
+CREATE OR REPLACE FUNCTION set_schemes_updated_at()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+  NEW.updated_at = clock_timestamp();
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS schemes_set_updated_at ON schemes;
+CREATE TRIGGER schemes_set_updated_at
+  BEFORE INSERT OR UPDATE ON schemes
+  FOR EACH ROW EXECUTE PROCEDURE set_schemes_updated_at();
 
 -- Verify
 SELECT column_name, data_type FROM information_schema.columns
@@ -91,7 +91,8 @@ create table if not exists schemes (
   state_specific  boolean not null default false,
   scraped_at      timestamptz,
   is_active       boolean not null default true,
-  created_at      timestamptz default now()
+  created_at      timestamptz default now(),
+  updated_at      timestamptz not null default now()
 );
 
 -- Add missing columns if the table already existed without them
@@ -124,8 +125,100 @@ do $$ begin
   if not exists (select 1 from information_schema.columns where table_name='schemes' and column_name='scraped_at') then
     alter table schemes add column scraped_at timestamptz;
   end if;
+  -- Change feed for the Policy Agent (polls rows with updated_at past its high-water mark)
+  if not exists (select 1 from information_schema.columns where table_name='schemes' and column_name='updated_at') then
+    alter table schemes add column updated_at timestamptz not null default now();
+  end if;
 end $$;
 
+create index if not exists schemes_updated_at_idx on schemes(updated_at);
+
+-- Bump updated_at on every insert and change, including deactivation
+-- (is_active = false). clock_timestamp(), not now(): now() is the start of
+-- the transaction, so a long upsert would stamp rows further before its
+-- commit. The Policy Agent still re-reads an overlap window behind its mark.
+create or replace function set_schemes_updated_at()
+returns trigger language plpgsql as $$
+begin
+  new.updated_at = clock_timestamp();
+  return new;
+end;
+$$;
+
+drop trigger if exists schemes_set_updated_at on schemes;
+create trigger schemes_set_updated_at
+  before insert or update on schemes
+  for each row execute procedure set_schemes_updated_at();
+
+-- Scheme queries (Policy Agent `query_schemes` request). Must return the same
+-- schemes, in the same order, as the Policy Agent's in-memory filter
+-- (query_snapshot): bounds are read the way its rule compiler reads them (the
+-- canonical key wins over its alias; an unusable value means the default of
+-- age 0-120 and an income limit of Rs.1 crore), states only apply to
+-- state_specific schemes and compare case-insensitively, and every word of
+-- the text must appear in the name, description or eligibility text.
+create or replace function scheme_rule_number(v jsonb) returns numeric
+language sql immutable as $$
+  select case
+    when jsonb_typeof(v) = 'number' then (v #>> '{}')::numeric
+    when jsonb_typeof(v) = 'boolean' then (v #>> '{}')::boolean::int
+    when jsonb_typeof(v) = 'string' and btrim(v #>> '{}') ~ '^[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?$'
+      then btrim(v #>> '{}')::numeric
+  end
+$$;
+
+create or replace function scheme_rule_bound(rules jsonb, key text, alias text, fallback numeric) returns numeric
+language sql immutable as $$
+  select coalesce(scheme_rule_number(case when rules ? key then rules->key else rules->alias end), fallback)
+$$;
+
+drop index if exists schemes_source_idx;
+drop index if exists schemes_rules_age_min_idx;
+drop index if exists schemes_rules_age_max_idx;
+drop index if exists schemes_rules_income_max_idx;
+drop index if exists schemes_rules_states_idx;
+drop index if exists schemes_search_idx;
+create index if not exists schemes_source_builtin_idx   on schemes((coalesce(nullif(source, ''), 'builtin')));
+create index if not exists schemes_category_idx         on schemes(category);
+create index if not exists schemes_state_specific_idx   on schemes(state_specific);
+create index if not exists schemes_rule_age_min_idx     on schemes((scheme_rule_bound(rules, 'age_min', 'min_age', 0)));
+create index if not exists schemes_rule_age_max_idx     on schemes((scheme_rule_bound(rules, 'age_max', 'max_age', 120)));
+create index if not exists schemes_rule_income_max_idx  on schemes((scheme_rule_bound(rules, 'income_max', 'max_income', 10000000)));
+
+create or replace function query_schemes(
+  p_category       text    default null,
+  p_state          text    default null,
+  p_age            numeric default null,
+  p_income         numeric default null,
+  p_source         text    default null,
+  p_state_specific boolean default null,
+  p_text           text    default null,
+  p_limit          int     default 500
+)
+returns setof schemes language sql stable as $$
+  select * from schemes s
+  where s.is_active
+    and (p_category is null or s.category = p_category)
+    and (p_source is null or coalesce(nullif(s.source, ''), 'builtin') = p_source)
+    and (p_state_specific is null or s.state_specific = p_state_specific)
+    and (p_state is null or not s.state_specific
+         or exists (select 1 from jsonb_array_elements_text(
+                      case jsonb_typeof(s.rules->'states')
+                        when 'array' then s.rules->'states'
+                        when 'string' then jsonb_build_array(s.rules->'states')
+                        when 'number' then jsonb_build_array(s.rules->'states')
+                        else '[]'::jsonb end) st
+                    where lower(btrim(st)) = lower(btrim(p_state))))
+    and (p_age is null or (scheme_rule_bound(s.rules, 'age_min', 'min_age', 0) <= p_age
+                           and scheme_rule_bound(s.rules, 'age_max', 'max_age', 120) >= p_age))
+    and (p_income is null or scheme_rule_bound(s.rules, 'income_max', 'max_income', 10000000) >= p_income)
+    and (p_text is null or not exists (
+          select 1 from regexp_split_to_table(lower(btrim(p_text)), '\s+') term
+          where term <> '' and strpos(lower(coalesce(s.name, '') || ' ' || coalesce(s.description, '') || ' ' || coalesce(s.eligibility_text, '')), term) = 0))
+  order by s.id collate "C"
+  limit p_limit;
+$$;
+
 
 -- 3. Citizens (form submissions, linked to auth user if logged in)
 create table if not exists citizens (
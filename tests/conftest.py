@@ -0,0 +1,48 @@
+"""
+Shared helpers for the agent tests. The agents are standalone scripts under
+agents/<name>-agent/agent.py; they are imported as modules here (their
+startup code only runs under `__main__`).
+"""
+
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# No on-disk state from a local run leaks into the tests.
+os.environ["EXPLANATION_CACHE_FILE"] = ""
+os.environ["CATALOG_SNAPSHOT_FILE"] = ""
+os.environ["CATALOG_CHANGELOG"] = ""
+
+_loaded = {}
+
+
+def load_agent(name: str):
+    """Import agents/<name>-agent/agent.py once per test session."""
+    if name not in _loaded:
+        path = ROOT / "agents" / f"{name}-agent" / "agent.py"
+        spec = importlib.util.spec_from_file_location(f"{name.replace('-', '_')}_agent", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _loaded[name] = module
+    return _loaded[name]
+
+
+@pytest.fixture(scope="session")
+def policy():
+    return load_agent("policy")
+
+
+@pytest.fixture(scope="session")
+def eligibility():
+    return load_agent("eligibility")
+
+
+@pytest.fixture(scope="session")
+def citizen():
+    return load_agent("citizen")
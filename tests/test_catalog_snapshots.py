@@ -0,0 +1,148 @@
+"""CatalogSnapshots: fetching the Policy Agent's catalog versions over its NDJSON stream."""
+
+import json
+
+import pytest
+import requests
+
+from zyndai_agent import catalog as catalog_module
+from zyndai_agent.catalog import CatalogSnapshots, CatalogUnavailable
+from zyndai_agent.message import AgentMessage
+
+VERSIONS = {
+    "v0": [{"id": "a", "name": "Old A"}],
+    "v1": [{"id": "a", "name": "A"}, {"id": "b", "name": "B"}],
+}
+
+
+class FakeStream:
+    def __init__(self, records):
+        self.lines = [json.dumps(r).encode() for r in records]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+
+class FakePolicyAgent:
+    """Answers /webhook/stream like the Policy Agent's catalog_stream_handler, serving `head` as current."""
+
+    def __init__(self, head="v1"):
+        self.head, self.down, self.truncate, self.requests = head, False, False, []
+        self.before_reply = None
+
+    def post(self, url, json=None, stream=False, timeout=None):
+        data = json["metadata"]
+        self.requests.append(data)
+        if self.down:
+            raise requests.ConnectionError("connection refused")
+        if self.before_reply:
+            self.before_reply(data)
+        version = data.get("version") if data.get("version") in VERSIONS else self.head
+        if data.get("if_none_match") == version:
+            return FakeStream([{"type": "catalog", "status": "not_modified", "version": version}])
+        records = [{"type": "catalog", "version": version, "count": len(VERSIONS[version])}]
+        records += [{"type": "scheme", "scheme": s} for s in VERSIONS[version]]
+        if not self.truncate:
+            records.append({"type": "end", "version": version})
+        return FakeStream(records)
+
+
+@pytest.fixture
+def policy_agent(monkeypatch):
+    fake = FakePolicyAgent()
+    monkeypatch.setattr(catalog_module.requests, "post", fake.post)
+    return fake
+
+
+def test_fetches_each_version_once(policy_agent):
+    snapshots = CatalogSnapshots("http://policy", "test", "Test")
+
+    assert snapshots.get("v0") == ("v0", {"a": VERSIONS["v0"][0]})
+    assert snapshots.get("v0")[1]["a"]["name"] == "Old A"
+    assert len(policy_agent.requests) == 1
+
+
+def test_unreachable_policy_agent_raises(policy_agent):
+    snapshots = CatalogSnapshots("http://policy", "test", "Test")
+    policy_agent.down = True
+
+    with pytest.raises(CatalogUnavailable) as raised:
+        snapshots.get("v0")
+    assert raised.value.version == "v0"
+    with pytest.raises(CatalogUnavailable):
+        snapshots.get()
+
+
+def test_truncated_stream_is_unavailable(policy_agent):
+    snapshots = CatalogSnapshots("http://policy", "test", "Test")
+    policy_agent.truncate = True
+
+    with pytest.raises(CatalogUnavailable):
+        snapshots.get("v1")
+    assert "v1" not in snapshots._snapshots
+
+
+def test_current_catalog_falls_back_to_cached_head(policy_agent):
+    snapshots = CatalogSnapshots("http://policy", "test", "Test")
+    assert snapshots.get()[0] == "v1"
+    policy_agent.down = True
+
+    version, by_id = snapshots.get()
+
+    assert version == "v1" and sorted(by_id) == ["a", "b"]
+
+
+def test_current_catalog_revalidates_cached_head(policy_agent):
+    snapshots = CatalogSnapshots("http://policy", "test", "Test")
+    snapshots.get()
+
+    assert snapshots.get()[0] == "v1"
+    assert policy_agent.requests[-1] == {"request": "get_all_schemes", "if_none_match": "v1"}
+
+
+def test_evicted_head_is_not_revalidated(policy_agent):
+    snapshots = CatalogSnapshots("http://policy", "test", "Test", kept=1)
+    snapshots.get()
+    snapshots.get("v0")  # evicts v1
+
+    version, by_id = snapshots.get()
+
+    assert version == "v1" and sorted(by_id) == ["a", "b"]
+    assert policy_agent.requests[-1]["if_none_match"] is None
+
+
+def test_not_modified_for_head_evicted_in_flight_refetches(policy_agent):
+    snapshots = CatalogSnapshots("http://policy", "test", "Test", kept=1)
+    snapshots.get()
+
+    def evict(data):
+        if data.get("if_none_match"):
+            snapshots._snapshots.clear()  # another caller's load evicted the head meanwhile
+    policy_agent.before_reply = evict
+
+    version, by_id = snapshots.get()
+
+    assert version == "v1" and sorted(by_id) == ["a", "b"]
+    assert [r.get("if_none_match") for r in policy_agent.requests[-2:]] == ["v1", None]
+
+
+def test_eligibility_reports_catalog_unavailable(eligibility, monkeypatch):
+    def unavailable(version=None):
+        raise CatalogUnavailable(version, "connection refused")
+    monkeypatch.setattr(eligibility.catalog_snapshots, "get", unavailable)
+    replies = []
+    monkeypatch.setattr(eligibility.agent, "set_response", lambda _id, body: replies.append(json.loads(body)))
+
+    message = {"citizen": {"age": 30, "income": 0, "category": "general"}, "catalog_version": "v9"}
+    eligibility.message_handler(AgentMessage(message_id="m", content=message), "")
+
+    assert replies == [{"error": "catalog_unavailable", "catalog_version": "v9"}]
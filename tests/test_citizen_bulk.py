@@ -0,0 +1,29 @@
+"""Bulk uploads: parsing CSV, NDJSON and JSON profiles into pipeline input rows."""
+
+
+def test_csv_rows_are_normalized(citizen):
+    rows = citizen.parse_bulk_profiles({"data": "age,income,category,state\n30,,farmer, Bihar \n,5000,,\n"})
+
+    assert rows == [
+        {"age": 30, "income": 0, "category": "farmer", "state": "Bihar"},
+        {"age": 0, "income": 5000, "category": "general", "state": ""},
+    ]
+
+
+def test_csv_row_with_extra_fields_is_an_error(citizen):
+    rows = citizen.parse_bulk_profiles({"data": "age,income\n30,100\n40,200,farmer,Bihar\n50,300\n"})
+
+    assert [r.get("age") for r in rows] == [30, None, 50]
+    assert rows[1] == {"_error": "Line 3 has 2 more field(s) than the header"}
+    assert None not in rows[1]
+
+
+def test_bad_rows_keep_their_position(citizen):
+    data = '{"age": 30}\nnot json\n{"age": "old"}\n'
+
+    rows = citizen.parse_bulk_profiles({"data": data})
+
+    assert rows[0]["age"] == 30
+    assert rows[1]["_error"].startswith("Invalid JSON line")
+    assert rows[2]["_error"].startswith("Invalid profile")
+    assert citizen.parse_bulk_profiles({"profiles": [{"age": 1}, "x"]})[1] == {"_error": "Profile must be an object"}
@@ -0,0 +1,98 @@
+"""The Citizen Agent's orchestration: the step DAG, the result cache and hedging."""
+
+import asyncio
+from collections import deque
+
+import pytest
+
+
+def step(value=None, fail=False, delay=0.0):
+    async def fn(deps):
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError("sub-agent down")
+        return (value, deps), {"count": 1}
+    return fn
+
+
+def test_failed_step_does_not_stop_its_dependents(citizen):
+    steps = {
+        "fetch":   ((), step(fail=True)),
+        "check":   (("fetch",), step("checked")),
+        "other":   ((), step("other", delay=0.01)),
+        "combine": (("check", "other"), step("combined")),
+    }
+
+    results, pipeline, timing = asyncio.run(citizen.run_pipeline_dag(steps))
+
+    assert results["fetch"] is None
+    assert results["check"] == ("checked", {"fetch": None})
+    assert results["combine"][0] == "combined"
+    reports = {p["step"]: p for p in pipeline}
+    assert reports["fetch"]["ok"] is False and reports["fetch"]["error"] == "sub-agent down"
+    assert reports["combine"]["depends_on"] == ["check", "other"]
+
+
+def test_unknown_dependency_is_rejected(citizen):
+    with pytest.raises(ValueError):
+        asyncio.run(citizen.run_pipeline_dag({"check": (("fetch",), step())}))
+
+
+def test_cache_is_dropped_when_the_catalog_version_changes(citizen, monkeypatch):
+    cache = citizen.PipelineCache(8, 60)
+    monkeypatch.setattr(citizen, "pipeline_cache", cache)
+    monkeypatch.setattr(citizen, "_catalog_version", {"version": None, "count": 0, "checked_at": 0.0})
+    replies = iter([{"version": "v1", "count": 2}, {"version": "v2", "count": 3}])
+
+    async def policy_agent(url, data, *args, **kwargs):
+        return next(replies)
+    monkeypatch.setattr(citizen, "call_sub_agent_async", policy_agent)
+    monkeypatch.setattr(citizen, "CATALOG_VERSION_TTL", 0)
+
+    assert asyncio.run(citizen.current_catalog_version()) == "v1"
+    cache.put(("k",), "v1", "report")
+    assert cache.get(("k",)) == "report"
+
+    assert asyncio.run(citizen.current_catalog_version()) == "v2"
+    assert cache.get(("k",)) is None
+    cache.put(("k",), "v1", "late report")  # a pipeline that started on v1
+    assert cache.get(("k",)) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+@pytest.fixture
+def hedging(citizen, monkeypatch):
+    """Fresh hedging state, with a 1ms hedge delay and a primary that takes 20ms."""
+    monkeypatch.setattr(citizen, "_latencies", {"set": deque([1.0] * 20)})
+    monkeypatch.setattr(citizen, "_hedge_window", deque(maxlen=8))
+    monkeypatch.setattr(citizen, "_hedge_stats", {"calls": 0, "hedged": 0, "hedge_wins": 0, "capped": 0})
+    monkeypatch.setattr(citizen, "HEDGE_MIN_DELAY_MS", 1)
+
+    async def post(url, body, timeout):
+        if url == "primary":
+            await asyncio.sleep(0.02)
+        return url
+    monkeypatch.setattr(citizen, "_post", post)
+
+    async def calls(n):
+        return [await citizen._post_hedged("primary", "backup", "set", {}, 5) for _ in range(n)]
+    return lambda n: asyncio.run(calls(n))
+
+
+def test_hedges_are_capped_at_the_max_rate(citizen, hedging, monkeypatch):
+    monkeypatch.setattr(citizen, "HEDGE_MAX_RATE", 0.25)
+
+    answers = hedging(8)
+
+    stats = citizen._hedge_stats
+    assert stats["calls"] == 8 and stats["capped"] > 0
+    assert answers.count("backup") == stats["hedged"] == stats["hedge_wins"]
+    assert 0 < stats["hedged"] <= 0.25 * 8
+    assert sum(citizen._hedge_window) == stats["hedged"]
+
+
+def test_no_hedging_before_enough_samples(citizen, hedging, monkeypatch):
+    monkeypatch.setattr(citizen, "HEDGE_MIN_SAMPLES", 50)
+
+    assert hedging(3) == ["primary"] * 3
+    assert citizen._hedge_stats["hedged"] == 0
@@ -0,0 +1,147 @@
+"""
+The Eligibility Agent's CompiledCatalog against the scalar rule checks of
+EligibilityResult: bitset lookups, the batch kernel, incremental
+re-evaluation and counterfactual ranking must all agree with them.
+"""
+
+import random
+
+import pytest
+
+CATEGORIES = ["sc_st", "obc", "general", "farmer", "student"]
+
+
+def make_schemes(rng, n):
+    schemes = []
+    for i in range(n):
+        rules = {
+            "categories": rng.sample(CATEGORIES, rng.randint(0, 2)),
+            "age_min": rng.choice([0, 18, 25, 60]),
+            "age_max": rng.choice([17, 40, 60, 120]),
+            "income_max": rng.choice([100000, 250000, 800000]),
+        }
+        if i % 5 == 0:
+            rules["where"] = {"field": "state", "in": rng.sample(["bihar", "up", "mp"], 2)}
+        elif i % 5 == 1:
+            rules["where"] = {"any": [{"field": "gender", "in": ["female"]}, {"field": "income", "max": 50000}]}
+        elif i % 5 == 2:
+            rules["documents"] = ["aadhaar"]
+        schemes.append({"id": f"s{i}", "name": f"Scheme {i}", "rules": rules})
+    return schemes
+
+
+def make_citizen(rng):
+    citizen = {
+        "age": rng.randint(5, 130),
+        "income": rng.choice([0, 40000, 90000, 200000, 300000, 1000000, 20000000]),
+        "category": rng.choice(CATEGORIES + ["unknown"]),
+        "state": rng.choice(["bihar", "up", "kerala", ""]),
+        "gender": rng.choice(["male", "female"]),
+    }
+    if rng.random() < 0.5:
+        citizen["documents"] = "aadhaar,pan"
+    return citizen
+
+
+def make_scope(rng, n):
+    return None if rng.random() < 0.7 else sum(1 << j for j in range(n) if rng.random() < 0.5)
+
+
+def in_scope(n, within):
+    return [j for j in range(n) if within is None or within >> j & 1]
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "python"])
+def build(request, eligibility, monkeypatch):
+    """CompiledCatalog factory, with and without the NumPy vectors."""
+    if request.param:
+        pytest.importorskip("numpy")
+    monkeypatch.setattr(eligibility, "_numpy_available", request.param)
+    return eligibility.CompiledCatalog
+
+
+def test_lookup_matches_scalar_results(eligibility, build):
+    rng = random.Random(1)
+    for _ in range(200):
+        catalog = build(make_schemes(rng, rng.randint(1, 60)))
+        citizen, within = make_citizen(rng), make_scope(rng, len(catalog))
+        results = {j: catalog.result(citizen, j) for j in in_scope(len(catalog), within)}
+
+        eligible, partial = catalog.lookup(citizen, partial_limit=5, within=within)
+
+        assert eligible == [j for j, r in results.items() if r.eligible]
+        expected = sorted((j for j, r in results.items() if not r.eligible), key=lambda j: -results[j].match_score)
+        assert partial == expected[:5]
+
+
+def test_batch_matches_scalar_results(eligibility, build):
+    rng = random.Random(2)
+    catalog = build(make_schemes(rng, 40))
+    citizens = [make_citizen(rng) for _ in range(50)] + [{"age": "unknown"}]
+
+    for min_score in (100, 67, 50, 0):
+        out, stats = eligibility.evaluate_batch(citizens, catalog, min_score=min_score)
+
+        assert stats["errors"] == 1 and "error" in out[-1]
+        for citizen, row in zip(citizens, out[:-1]):
+            results = [catalog.result(citizen, j) for j in range(len(catalog))]
+            assert [s["scheme_id"] for s in row["eligible"]] == [r.scheme["id"] for r in results if r.eligible]
+            partial = {(s["scheme_id"], s["match_score"]) for s in row.get("partial", [])}
+            assert partial == {(r.scheme["id"], r.match_score) for r in results
+                               if not r.eligible and r.match_score >= min_score}
+
+
+def test_reevaluate_matches_full_evaluation(eligibility, build):
+    rng = random.Random(3)
+    for _ in range(150):
+        catalog = build(make_schemes(rng, rng.randint(1, 80)))
+        within = make_scope(rng, len(catalog))
+        before = make_citizen(rng)
+        eligible = eligibility.index_bits(catalog.lookup(before, within=within)[0])
+        for _ in range(4):
+            fresh = make_citizen(rng)
+            delta = {k: fresh[k] for k in rng.sample(sorted(fresh), rng.randint(1, 2))}
+            if rng.random() < 0.2:
+                delta = {"documents": None}
+            after = {**before, **delta}
+
+            eligible, _ = catalog.reevaluate(before, after, eligible, within)
+
+            expected = [j for j in in_scope(len(catalog), within) if catalog.result(after, j).eligible]
+            assert eligibility.bit_indices(eligible) == expected
+            before = after
+
+
+def test_counterfactuals_match_brute_force(build):
+    rng = random.Random(4)
+    for _ in range(200):
+        catalog = build(make_schemes(rng, rng.randint(1, 60)))
+        citizen, within = make_citizen(rng), make_scope(rng, len(catalog))
+        limit = rng.randint(1, 8)
+
+        ranked = catalog.counterfactuals(citizen, limit, within)
+
+        distances = [(catalog.result(citizen, j).distance, j) for j in in_scope(len(catalog), within)]
+        expected = sorted((d, j) for d, j in distances if 0 < d < float("inf"))[:limit]
+        assert [(round(d, 9), j) for d, j in ranked] == [(round(d, 9), j) for d, j in expected]
+        assert not any(catalog.result(citizen, j).eligible for _, j in ranked)
+
+
+def test_change_text_uses_category_labels(build):
+    catalog = build([{"id": "a", "name": "A", "rules": {"categories": ["sc_st", "obc"]}}])
+
+    changes = catalog.result({"age": 30, "income": 0, "category": "general"}, 0).changes()
+
+    assert changes == [{"field": "category", "one_of": ["obc", "sc_st"], "text": "open to the OBC or SC/ST category"}]
+
+
+def test_template_explanation_names_close_schemes(eligibility, build):
+    schemes = [{"id": f"s{i}", "name": f"Scheme {i}", "rules": {"age_min": 40 + i}} for i in range(8)]
+    catalog = build(schemes + [{"id": "open", "name": "Open", "rules": {}}])
+    citizen = {"age": 30, "income": 0, "category": "general"}
+    reachable = [catalog.result(citizen, j) for _, j in catalog.counterfactuals(citizen, 5)]
+
+    insight = eligibility.template_explain_eligibility([catalog.result(citizen, 8)], reachable)
+
+    assert insight["summary"] == ("You qualify for 1 scheme: Open. "
+                                  "You are one requirement away from other schemes including Scheme 0 and Scheme 1.")
@@ -0,0 +1,53 @@
+"""The Eligibility Agent's message handler: request validation and replies."""
+
+import json
+
+import pytest
+
+from zyndai_agent.message import AgentMessage
+
+SCHEMES = [
+    {"id": "a", "name": "A", "rules": {"categories": ["general"], "age_min": 18, "age_max": 60}},
+    {"id": "b", "name": "B", "rules": {"categories": ["farmer"], "age_min": 18}},
+]
+
+
+@pytest.fixture
+def ask(eligibility, monkeypatch):
+    """Send one request to the handler and return its reply."""
+    def ask(**request):
+        replies = []
+        monkeypatch.setattr(eligibility.agent, "set_response", lambda _id, body: replies.append(json.loads(body)))
+        eligibility.message_handler(AgentMessage(message_id="m", content={"schemes": SCHEMES, **request}), "")
+        assert len(replies) == 1
+        return replies[0]
+    return ask
+
+
+def test_single_profile_is_evaluated(ask):
+    reply = ask(citizen={"age": 30, "income": 0, "category": "general"}, explain=False, partial_limit=1)
+
+    assert [s["scheme_id"] for s in reply["eligible"]] == ["a"]
+    assert [s["scheme_id"] for s in reply["partial"]] == ["b"]
+
+
+@pytest.mark.parametrize("field", ["partial_limit", "counterfactual_limit"])
+def test_non_integer_limit_is_rejected(ask, field):
+    reply = ask(citizen={"age": 30, "category": "general"}, **{field: "x"})
+
+    assert reply == {"error": f"{field} must be an integer"}
+
+
+@pytest.mark.parametrize("citizen", [{"age": "thirty"}, {"age": 30, "income": [1]}])
+def test_invalid_profile_is_rejected(ask, citizen):
+    reply = ask(citizen=citizen)
+
+    assert reply["error"].startswith("Invalid profile: ")
+
+
+@pytest.mark.parametrize("request_fields, error", [
+    ({"citizens": [{"age": 30}], "min_score": "high"}, "min_score must be an integer"),
+    ({"citizen": {"age": 30}, "llm_budget_ms": "soon"}, "llm_budget_ms must be an integer"),
+])
+def test_non_integer_batch_and_budget_fields_are_rejected(ask, request_fields, error):
+    assert ask(**request_fields) == {"error": error}
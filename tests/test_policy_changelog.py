@@ -0,0 +1,58 @@
+"""CATALOG_CHANGELOG: the local change feed applied on top of full loads."""
+
+import json
+
+import pytest
+
+
+def entry(sid, name, at, op="upsert"):
+    return json.dumps({"op": op, "scheme": {"id": sid, "name": name, "rules": {}}, "at": at}) + "\n"
+
+
+@pytest.fixture
+def changelog(policy, tmp_path, monkeypatch):
+    path = tmp_path / "changes.ndjson"
+    path.write_text("")
+    monkeypatch.setattr(policy, "CATALOG_CHANGELOG", str(path))
+    monkeypatch.setattr(policy, "SUPABASE_URL", None)
+    monkeypatch.setattr(policy, "_changelog", {})
+    monkeypatch.setattr(policy, "_change_marks", {"updated_at": None, "offset": 0})
+    return path
+
+
+def names(snapshot):
+    return {s["id"]: s["name"] for s in snapshot.schemes}
+
+
+def test_latest_entry_per_scheme_wins(policy, changelog):
+    changelog.write_text(entry("x", "new", "2026-02-01") + entry("x", "old", "2026-01-01") + entry("y", "Y", "2026-01-05"))
+
+    snapshot = policy.load_catalog()
+
+    assert names(snapshot)["x"] == "new"
+    assert names(snapshot)["y"] == "Y"
+
+
+def test_full_reload_keeps_offset_and_applied_entries(policy, changelog):
+    changelog.write_text(entry("x", "first", "2026-01-01"))
+    policy.load_catalog()
+    offset = policy._change_marks["offset"]
+
+    with open(changelog, "a") as f:
+        f.write(entry("x", "second", "2026-01-02") + entry("z", "Z", "2026-01-03", op="delete"))
+    assert [c[1] for c in policy.read_changelog()] == ["x", "z"]
+    assert policy._change_marks["offset"] > offset
+
+    snapshot = policy.load_catalog()
+    assert names(snapshot)["x"] == "second"
+    assert "z" not in names(snapshot)
+    assert policy.read_changelog() == []
+
+
+def test_ignored_when_supabase_is_configured(policy, changelog, monkeypatch):
+    changelog.write_text(entry("pm_kisan", "stale", "2020-01-01"))
+    monkeypatch.setattr(policy, "SUPABASE_URL", "https://example.supabase.co")
+    monkeypatch.setattr(policy, "SUPABASE_KEY", "key")
+
+    assert policy.read_changelog() == []
+    assert policy._change_marks["offset"] == 0
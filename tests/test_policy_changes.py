@@ -0,0 +1,66 @@
+"""The Supabase change feed: polling rows past the updated_at high-water mark."""
+
+import pytest
+
+
+class FakeQuery:
+    """The slice of the Supabase query builder poll_supabase_changes uses, over an in-memory table."""
+
+    def __init__(self, rows):
+        self.rows, self.since = rows, None
+
+    def table(self, name):
+        assert name == "schemes"
+        return self
+
+    def select(self, columns):
+        return self
+
+    def gte(self, column, value):
+        assert column == "updated_at"
+        self.since = value
+        return self
+
+    def order(self, column):
+        return self
+
+    def execute(self):
+        data = sorted((r for r in self.rows if r["updated_at"] >= self.since), key=lambda r: r["updated_at"])
+        return type("Result", (), {"data": data})()
+
+
+def row(sid, updated_at, active=True):
+    return {"id": sid, "name": sid.upper(), "rules": {}, "is_active": active, "updated_at": updated_at}
+
+
+@pytest.fixture
+def table(policy, monkeypatch):
+    rows = [row("a", "2026-03-01T10:00:00+00:00")]
+    monkeypatch.setattr(policy, "_sb", FakeQuery(rows))
+    monkeypatch.setattr(policy, "CATALOG_CHANGES_OVERLAP", 60)
+    monkeypatch.setattr(policy, "_change_marks", {"updated_at": "2026-03-01T10:00:00+00:00", "offset": 0})
+    monkeypatch.setattr(policy, "_changes_seen", {("a", "2026-03-01T10:00:00+00:00")})
+    return rows
+
+
+def test_rows_at_the_mark_are_not_reapplied(policy, table):
+    assert policy.poll_supabase_changes() == []
+
+
+def test_late_commit_behind_the_mark_is_picked_up(policy, table):
+    table.append(row("b", "2026-03-01T10:00:05+00:00"))
+    assert [c[:2] for c in policy.poll_supabase_changes()] == [("upsert", "b")]
+
+    # Stamped before the mark, but only visible after the last poll committed
+    table.append(row("c", "2026-03-01T10:00:02+00:00", active=False))
+    assert [c[:2] for c in policy.poll_supabase_changes()] == [("delete", "c")]
+    assert policy._change_marks["updated_at"] == "2026-03-01T10:00:05+00:00"
+    assert policy.poll_supabase_changes() == []
+
+
+def test_rows_before_the_overlap_window_are_forgotten(policy, table):
+    table.append(row("b", "2026-03-01T10:05:00+00:00"))
+    policy.poll_supabase_changes()
+
+    assert policy._changes_seen == {("b", "2026-03-01T10:05:00+00:00")}
+    assert table[-1]["updated_at"] == policy._change_marks["updated_at"]
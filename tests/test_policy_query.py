@@ -0,0 +1,184 @@
+"""
+`query_schemes`: rows pushed down to Supabase must come back like the
+in-memory snapshot filter's — same schemes, same order, same shape.
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+
+import pytest
+
+from zyndai_agent.message import AgentMessage
+
+ROWS = [
+    {"id": "b_state", "name": "Bihar Scholarship", "category": "student", "description": "Post-matric aid",
+     "eligibility_text": "", "rules": {"states": ["Bihar ", "UP"], "age_min": 16, "age_max": 30},
+     "source": "scraped", "state_specific": True, "is_active": True},
+    {"id": "a_alias", "name": "Senior Pension", "category": "senior", "description": "Monthly PENSION",
+     "eligibility_text": "old age", "rules": json.dumps({"min_age": "60", "max_income": 200000}),
+     "source": None, "state_specific": False, "is_active": True},
+    {"id": "C_scalar_state", "name": "Kerala Housing", "category": "housing", "description": None,
+     "eligibility_text": "Kerala residents", "rules": {"states": "kerala", "income_max": "3e5"},
+     "source": "", "state_specific": True, "is_active": True},
+    {"id": "d_bad_bound", "name": "Farmer Support", "category": "farmer", "description": "seed and pension",
+     "eligibility_text": None, "rules": {"age_min": "eighteen", "min_age": 40, "income_max": 500000},
+     "source": "builtin", "state_specific": False, "is_active": True},
+    {"id": "e_no_states", "name": "State Grant", "category": "student", "description": "grant",
+     "eligibility_text": "", "rules": {}, "source": "scraped", "state_specific": True, "is_active": True},
+]
+
+FILTERS = [
+    {},
+    {"category": "student"},
+    {"state": "bihar"},
+    {"state": "KERALA"},
+    {"state": "Goa"},
+    {"source": "builtin"},
+    {"source": "scraped", "state_specific": True},
+    {"age": 25},
+    {"age": 65},
+    {"age": 17},
+    {"income": 250000},
+    {"income": 400000},
+    {"text": "pension"},
+    {"text": "Kerala residents"},
+    {"text": "pension monthly"},
+    {"age": 45, "income": 100000, "text": "pension"},
+]
+
+SCHEMA = Path(__file__).resolve().parent.parent / "supabase" / "schema.sql"
+
+
+def sql_parameters() -> set:
+    """Parameter names of the `query_schemes` SQL function in supabase/schema.sql."""
+    header = re.search(r"function query_schemes\((.*?)\)\s*returns", SCHEMA.read_text(), re.S).group(1)
+    return set(re.findall(r"\b(p_\w+)\s", header))
+
+
+class FakeRpc:
+    """Stands in for the Supabase client: answers `query_schemes` with the given raw rows."""
+
+    def __init__(self, rows):
+        self.rows, self.calls = rows, []
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        return self
+
+    def execute(self):
+        return type("Result", (), {"data": self.rows})()
+
+
+@pytest.fixture
+def snapshot(policy):
+    return policy.CatalogSnapshot.build([policy.normalize_row(r) for r in ROWS], "supabase")
+
+
+def run_query(policy, monkeypatch, payload):
+    replies = []
+    monkeypatch.setattr(policy.agent, "set_response", lambda _id, body: replies.append(json.loads(body)))
+    policy.message_handler(AgentMessage(message_id="m", content={"request": "query_schemes", **payload}), "")
+    return replies[0]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_pushed_down_rows_match_snapshot_rows(policy, snapshot, monkeypatch, filters):
+    # The fake returns the rows the SQL should select, so this covers parameters and
+    # row conversion; the SQL filter itself is test_sql_function_matches_snapshot_filter
+    expected = policy.query_snapshot(snapshot, filters, 100)
+    raw = [r for r in ROWS if r["id"] in {s["id"] for s in expected}]
+    raw.sort(key=lambda r: [s["id"] for s in expected].index(r["id"]))
+    fake = FakeRpc(raw)
+    monkeypatch.setattr(policy, "_sb", fake)
+    monkeypatch.setattr(policy, "_current", snapshot)
+
+    reply = run_query(policy, monkeypatch, {"query": filters, "limit": 100})
+
+    assert reply["pushdown"] is True
+    assert fake.calls[0][0] == "query_schemes"
+    assert set(fake.calls[0][1]) <= sql_parameters()
+    assert reply["schemes"] == json.loads(json.dumps(expected))
+    assert all("compiled_rules" in s for s in reply["schemes"])
+    assert reply["version"] == snapshot.version
+
+
+@pytest.mark.parametrize("query, params", [
+    ({}, {"p_limit": 100}),
+    ({"category": " student ", "state": "Bihar", "age": "25", "income": 250000},
+     {"p_category": "student", "p_state": "Bihar", "p_age": 25.0, "p_income": 250000.0, "p_limit": 100}),
+    ({"source": "scraped", "state_specific": "true", "text": " seed pension "},
+     {"p_source": "scraped", "p_state_specific": True, "p_text": "seed pension", "p_limit": 100}),
+    ({"state_specific": False, "category": "", "age": ""}, {"p_state_specific": False, "p_limit": 100}),
+])
+def test_filters_map_to_sql_parameters(policy, snapshot, monkeypatch, query, params):
+    fake = FakeRpc([])
+    monkeypatch.setattr(policy, "_sb", fake)
+    monkeypatch.setattr(policy, "_current", snapshot)
+
+    run_query(policy, monkeypatch, {"query": query, "limit": 100})
+
+    assert fake.calls == [("query_schemes", params)]
+    assert set(params) <= sql_parameters()
+
+
+def test_sql_function_takes_every_filter(policy):
+    query = {"category": "c", "state": "s", "age": 1, "income": 1, "source": "s", "state_specific": True, "text": "t"}
+
+    assert {f"p_{key}" for key in policy.parse_query({"query": query})} | {"p_limit"} == sql_parameters()
+
+
+def test_snapshot_filter_semantics(policy, snapshot):
+    ids = lambda filters: [s["id"] for s in policy.query_snapshot(snapshot, filters, 100)]
+    assert ids({}) == ["C_scalar_state", "a_alias", "b_state", "d_bad_bound", "e_no_states"]
+    assert ids({"state": "bihar"}) == ["a_alias", "b_state", "d_bad_bound"]
+    assert ids({"state": "KERALA"}) == ["C_scalar_state", "a_alias", "d_bad_bound"]
+    assert ids({"source": "builtin"}) == ["C_scalar_state", "a_alias", "d_bad_bound"]
+    # "eighteen" is unusable and age_min wins over min_age, so the default of 0 applies
+    assert "d_bad_bound" in ids({"age": 10})
+    assert ids({"income": 250000}) == ["C_scalar_state", "b_state", "d_bad_bound", "e_no_states"]
+    assert ids({"text": "pension monthly"}) == ["a_alias"]
+
+
+def test_changed_live_rows_report_no_version(policy, snapshot, monkeypatch):
+    changed = dict(ROWS[1], name="Senior Pension (revised)")
+    monkeypatch.setattr(policy, "_sb", FakeRpc([changed]))
+    monkeypatch.setattr(policy, "_current", snapshot)
+
+    reply = run_query(policy, monkeypatch, {"query": {"text": "pension"}})
+
+    assert reply["pushdown"] is True
+    assert reply["version"] is None
+    assert reply["schemes"][0]["compiled_rules"]["age_min"] == 60
+
+
+def test_failed_pushdown_filters_snapshot(policy, snapshot, monkeypatch):
+    class Broken(FakeRpc):
+        def execute(self):
+            raise RuntimeError("function query_schemes does not exist")
+
+    monkeypatch.setattr(policy, "_sb", Broken([]))
+    monkeypatch.setattr(policy, "_current", snapshot)
+
+    reply = run_query(policy, monkeypatch, {"query": {"category": "student"}})
+
+    assert reply["pushdown"] is False
+    assert [s["id"] for s in reply["schemes"]] == ["b_state", "e_no_states"]
+    assert reply["version"] == snapshot.version
+
+
+@pytest.mark.skipif(
+    not (os.environ.get("SUPABASE_URL") and os.environ.get("SUPABASE_SERVICE_ROLE_KEY")),
+    reason="needs a Supabase project with supabase/schema.sql applied",
+)
+@pytest.mark.parametrize("filters", FILTERS)
+def test_sql_function_matches_snapshot_filter(policy, filters):
+    pytest.importorskip("supabase")
+    schemes = policy.fetch_schemes_from_supabase()
+    assert schemes is not None
+    snapshot = policy.CatalogSnapshot.build(schemes, "supabase")
+
+    pushed = policy.query_supabase(filters, 500)
+
+    assert [s["id"] for s in pushed] == [s["id"] for s in policy.query_snapshot(snapshot, filters, 500)]
@@ -0,0 +1,54 @@
+"""The Policy Agent's on-disk catalog snapshot (CATALOG_SNAPSHOT_FILE)."""
+
+import json
+
+import pytest
+
+
+@pytest.fixture
+def snapshot_file(policy, tmp_path, monkeypatch):
+    path = tmp_path / "catalog.snapshot.ndjson"
+    monkeypatch.setattr(policy, "CATALOG_SNAPSHOT_FILE", str(path))
+    return path
+
+
+@pytest.fixture
+def saved(policy, snapshot_file):
+    schemes = [{"id": "a", "name": "A", "rules": {"min_age": 18}}, {"id": "b", "name": "B", "rules": {}}]
+    snapshot = policy.CatalogSnapshot.build(schemes, "supabase")
+    policy.save_snapshot_file(snapshot)
+    return snapshot
+
+
+def rewrite(policy, path, edit):
+    """Apply `edit` to every stored row, keeping the header consistent with the rows as written."""
+    lines = path.read_text().splitlines()
+    header, rows = json.loads(lines[0]), [edit(json.loads(line)) for line in lines[1:]]
+    header["version"] = policy.catalog_version(policy.scheme_hash(r) for r in rows)
+    path.write_text("\n".join(json.dumps(x) for x in [header, *rows]) + "\n")
+
+
+def test_round_trip(policy, saved):
+    loaded = policy.load_snapshot_file()
+
+    assert loaded.version == saved.version
+    assert loaded.schemes == saved.schemes
+
+
+def test_rules_from_an_older_compiler_are_recompiled(policy, saved, snapshot_file, capsys):
+    rewrite(policy, snapshot_file, lambda row: {**row, "compiled_rules": {**row["compiled_rules"], "v": 1}})
+
+    loaded = policy.load_snapshot_file()
+
+    assert loaded is not None
+    assert loaded.version == saved.version
+    assert all(s["compiled_rules"]["v"] == policy.RULES_COMPILER_VERSION for s in loaded.schemes)
+    assert "older compiler" in capsys.readouterr().out
+
+
+def test_corrupt_file_is_ignored(policy, saved, snapshot_file, capsys):
+    text = snapshot_file.read_text()
+    snapshot_file.write_text(text.replace('"name":"B"', '"name":"Bee"'))
+
+    assert policy.load_snapshot_file() is None
+    assert "corrupt file" in capsys.readouterr().out
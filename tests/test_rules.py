@@ -0,0 +1,29 @@
+"""The `where` condition language in zyndai_agent/rules.py."""
+
+import pytest
+
+from zyndai_agent.rules import compile_rules, condition_predicate
+
+
+def predicate(where):
+    return condition_predicate(compile_rules({"where": where})["where"])[0]
+
+
+@pytest.mark.parametrize("where, citizen, expected", [
+    ({"field": "state", "in": ["kerala"]}, {"state": "Kerala"}, True),
+    ({"field": "state", "in": ["kerala"]}, {}, True),
+    ({"field": "state", "in": ["kerala"], "if_missing": False}, {}, False),
+    ({"not": {"field": "state", "in": ["kerala"]}}, {"state": "kerala"}, False),
+    ({"not": {"field": "state", "in": ["kerala"]}}, {"state": "bihar"}, True),
+    ({"not": {"field": "state", "in": ["kerala"]}}, {}, True),
+    ({"not": {"field": "state", "in": ["kerala"], "if_missing": False}}, {}, False),
+    ({"not": {"not": {"field": "state", "in": ["kerala"]}}}, {"state": "bihar"}, False),
+    ({"not": {"field": "land_ha", "max": 2}}, {"land_ha": "lots"}, False),
+    ({"not": {"all": [{"field": "bpl", "is": True}, {"field": "land_ha", "max": 2}]}}, {"bpl": "yes", "land_ha": 5}, True),
+    ({"not": {"all": [{"field": "bpl", "is": True}, {"field": "land_ha", "max": 2}]}}, {"bpl": "yes", "land_ha": 1}, False),
+    ({"not": {"all": [{"field": "bpl", "is": True}, {"field": "land_ha", "max": 2}]}}, {"bpl": "yes"}, True),
+    ({"not": {"any": [{"field": "gender", "eq": "female"}, {"field": "state", "in": ["up"]}]}}, {"gender": "male"}, True),
+    ({"not": {"any": [{"field": "gender", "eq": "female"}, {"field": "state", "in": ["up"]}]}}, {"state": "UP"}, False),
+])
+def test_condition_predicate(where, citizen, expected):
+    assert predicate(where)(citizen) is expected
@@ -13,6 +13,16 @@ export interface PipelineStep {
   step: string;
   count?: number;
   ok: boolean;
+  depends_on?: string[];
+  started_ms?: number;
+  duration_ms?: number;
+}
+
+export interface PipelineTiming {
+  total_ms: number;
+  sum_of_steps_ms: number;
+  critical_path_ms: number;
+  overlap_ms: number;
 }
 
 export interface AgentPipelineResponse {
@@ -25,6 +35,7 @@ export interface AgentPipelineResponse {
   summary: string;
   total_eligible: number;
   pipeline: PipelineStep[];
+  pipeline_timing?: PipelineTiming;
   agent_id: string;
 }
 
@@ -5,9 +5,10 @@ Local implementation of ZyndAIAgent.
 
 This file provides a real Flask-based HTTP webhook server so every agent
 actually listens on its configured port and handles:
-  GET  /health          → {"status": "ok", "agent": "...", "agent_id": "..."}
+  GET  /health          → {"status": "ok", "agent": "...", "agent_id": "...", ...health hook fields}
   POST /webhook         → fire-and-forget, calls registered message handler
   POST /webhook/sync    → synchronous, waits for set_response() and returns it
+  POST /webhook/stream  → streams the records yielded by the stream handler as NDJSON
 
 The Flask server starts in a background daemon thread when
 add_message_handler() is called, so agents only need to call:
@@ -16,7 +17,7 @@ add_message_handler() is called, so agents only need to call:
 """
 
 from dataclasses import dataclass, field
-from typing import Any, Dict, Callable, Optional
+from typing import Any, Dict, Callable, Iterable, Optional
 import uuid
 import threading
 import json
@@ -47,6 +48,7 @@ class ZyndAIAgent:
       GET  /health
       POST /webhook        (async – no wait for handler result)
       POST /webhook/sync   (sync  – blocks until set_response() is called, max 30 s)
+      POST /webhook/stream (NDJSON – one line per record yielded by the stream handler)
     """
 
     def __init__(self, agent_config: AgentConfig = None, **kwargs):
@@ -54,6 +56,8 @@ class ZyndAIAgent:
         self.config = cfg
         self.agent_id = f"agent:{cfg.name.lower().replace(' ', '-')}:{uuid.uuid4().hex[:6]}"
         self._handler: Optional[Callable] = None
+        self._stream_handler: Optional[Callable] = None
+        self._health_hook: Optional[Callable] = None
         self._responses: Dict[str, Any] = {}
         self._events: Dict[str, threading.Event] = {}
         self._lock = threading.Lock()
@@ -68,6 +72,25 @@ class ZyndAIAgent:
         self._handler = handler
         self._start_server()
 
+    def add_stream_handler(self, handler: Callable[[Any, str], Iterable]) -> None:
+        """
+        Register a handler for POST /webhook/stream.
+
+        The handler returns an iterable of JSON-serialisable records which are
+        written to the client as NDJSON while they are produced. Non-JSON
+        request bodies (CSV, NDJSON uploads) arrive as
+        `{"data": <text>, "content_type": <mime type>}`.
+        """
+        self._stream_handler = handler
+        self._start_server()
+
+    def add_health_hook(self, hook: Callable[[], Dict]) -> None:
+        """
+        Register a function whose dict is merged into GET /health, e.g. data
+        freshness. Does not start the server on its own.
+        """
+        self._health_hook = hook
+
     def set_response(self, message_id: str, response: Any) -> None:
         """Called by the handler to deliver a synchronous response."""
         with self._lock:
@@ -88,7 +111,7 @@ class ZyndAIAgent:
         # Import Flask lazily so agents can still import agent.py without
         # Flask installed (although it must be present at runtime).
         try:
-            from flask import Flask, request, jsonify
+            from flask import Flask, Response, request, jsonify, stream_with_context
         except ImportError as e:
             raise ImportError(
                 "flask is required by ZyndAIAgent. "
@@ -106,11 +129,17 @@ class ZyndAIAgent:
         # ── /health ──────────────────────────────────────────────────
         @app.get("/health")
         def health():
-            return jsonify({
+            info = {
                 "status":   "ok",
                 "agent":    agent_ref.config.name,
                 "agent_id": agent_ref.agent_id,
-            })
+            }
+            if agent_ref._health_hook:
+                try:
+                    info.update(agent_ref._health_hook() or {})
+                except Exception as exc:
+                    info["health_hook_error"] = str(exc)
+            return jsonify(info)
 
         # ── /webhook (fire-and-forget) ────────────────────────────────
         @app.post("/webhook")
@@ -179,6 +208,32 @@ class ZyndAIAgent:
                 "response":   response,
             })
 
+        # ── /webhook/stream (NDJSON) ──────────────────────────────────
+        @app.post("/webhook/stream")
+        def webhook_stream():
+            if not agent_ref._stream_handler:
+                return jsonify({"status": "error", "error": "No stream handler registered"}), 404
+
+            body = request.get_json(silent=True)
+            if not isinstance(body, dict):
+                body = {"data": request.get_data(as_text=True), "content_type": request.mimetype or ""}
+            msg = AgentMessage(
+                message_id=body.get("message_id") or str(uuid.uuid4()),
+                sender_id=body.get("sender_id", ""),
+                content=body,
+                metadata=body.get("metadata") or {},
+            )
+
+            def _generate():
+                try:
+                    for record in agent_ref._stream_handler(msg, body.get("topic", "stream")):
+                        yield (record if isinstance(record, str) else json.dumps(record)) + "\n"
+                except Exception as exc:
+                    print(f"[{agent_ref.config.name}] Stream handler exception: {exc}")
+                    yield json.dumps({"type": "error", "error": str(exc)}) + "\n"
+
+            return Response(stream_with_context(_generate()), mimetype="application/x-ndjson")
+
         # ── Start Flask in a background thread ────────────────────────
         def _run():
             app.run(
@@ -0,0 +1,139 @@
+"""
+zyndai_agent/catalog.py
+=======================
+Local copies of the Policy Agent's catalog snapshots.
+
+Requests between agents may carry only a `catalog_version` and scheme ids;
+the schemes for that version are fetched from the Policy Agent once, over
+its NDJSON stream, and kept locally:
+
+    snapshots = CatalogSnapshots(POLICY_AGENT_URL, agent.agent_id, "Matcher Agent")
+    version, by_id = snapshots.get(catalog_version)  # raises CatalogUnavailable
+
+Cached versions are read without taking the lock. A miss is fetched outside
+the lock, once per version: concurrent callers asking for the same version
+wait for that one download instead of starting their own.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import requests
+
+
+class CatalogUnavailable(Exception):
+    """The Policy Agent could not supply the requested catalog version."""
+
+    def __init__(self, version: str | None, reason: str):
+        super().__init__(f"catalog {version} unavailable: {reason}")
+        self.version = version
+
+
+class CatalogSnapshots:
+    """Schemes by id for the last `kept` catalog versions loaded from the Policy Agent."""
+
+    def __init__(self, policy_url: str, sender_id: str, label: str, kept: int = 3, timeout: float = 20):
+        self.policy_url = policy_url.rstrip("/")
+        self.sender_id = sender_id
+        self.label = label
+        self.kept = kept
+        self.timeout = timeout
+        self.head = None                # latest version the Policy Agent reported as current
+        self._snapshots = OrderedDict()  # version -> {scheme_id: scheme}, oldest loaded first
+        self._flights = {}               # version (None = current) -> Future of the fetch in progress
+        self._lock = threading.Lock()
+
+    def get(self, version: str | None = None) -> tuple:
+        """
+        Schemes by id for a catalog version, fetched from the Policy Agent the
+        first time the version is seen. Returns `(version, schemes_by_id)`; the
+        version differs from the requested one if the Policy Agent no longer
+        keeps it and sent its current catalog instead. Raises
+        CatalogUnavailable when the snapshot cannot be fetched (for the
+        current catalog, only if no copy of the last one is kept).
+
+        With no version, returns the current catalog: the local copy is
+        revalidated with `if_none_match` and only downloaded again if it changed.
+        """
+        if version is not None:
+            by_id = self._snapshots.get(version)
+            if by_id is not None:
+                return version, by_id
+        with self._lock:
+            if version is not None and version in self._snapshots:
+                return version, self._snapshots[version]
+            flight = self._flights.get(version)
+            leader = flight is None
+            if leader:
+                flight = self._flights[version] = Future()
+        if not leader:
+            return flight.result()
+        try:
+            result = self._fetch(version)
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._flights[version]
+
+    def _fetch(self, version: str | None, revalidate: bool = True) -> tuple:
+        if version is None:
+            # Revalidate only a head that is still cached: a "not_modified"
+            # answer for an evicted version would leave nothing to serve.
+            head = self.head if revalidate and self.head in self._snapshots else None
+            data = {"request": "get_all_schemes", "if_none_match": head}
+        else:
+            data = {"request": "get_snapshot", "version": version}
+        # Streamed as NDJSON, so schemes are indexed as they arrive instead of
+        # after one large response body has been read and parsed.
+        header, by_id, complete = {}, {}, False
+        try:
+            with requests.post(
+                f"{self.policy_url}/webhook/stream",
+                json={"sender_id": self.sender_id, "metadata": data}, stream=True, timeout=self.timeout,
+            ) as resp:
+                resp.raise_for_status()
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    kind = record.get("type")
+                    if kind == "scheme":
+                        by_id[record["scheme"].get("id")] = record["scheme"]
+                    elif kind == "catalog":
+                        header = record
+                    elif kind == "end":
+                        complete = True
+                    elif kind == "error":
+                        raise RuntimeError(record.get("error"))
+            if not complete and header.get("status") != "not_modified":
+                raise RuntimeError("catalog stream ended early")
+        except Exception as e:
+            print(f"[{self.label}] Catalog snapshot {version} unavailable: {e}")
+            head = self.head
+            if version is None and head in self._snapshots:
+                return head, self._snapshots[head]
+            raise CatalogUnavailable(version, str(e)) from e
+        got = header.get("version") or version
+        with self._lock:
+            if got != version:
+                self.head = got
+            if header.get("status") == "not_modified":
+                if got in self._snapshots:
+                    return got, self._snapshots[got]
+                refetch = True  # evicted since the request went out
+            else:
+                refetch = False
+                self._snapshots[got] = by_id
+            while len(self._snapshots) > self.kept:
+                self._snapshots.popitem(last=False)
+        if refetch:
+            return self._fetch(version, revalidate=False)
+        print(f"[{self.label}] Loaded catalog snapshot {got} ({len(by_id)} schemes)")
+        return got, by_id
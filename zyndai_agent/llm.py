@@ -0,0 +1,32 @@
+"""
+zyndai_agent/llm.py
+===================
+Budgeted LLM enrichments. Agents run LLM calls on a thread pool so that a
+slow answer never holds up the deterministic part of a response:
+
+    insight, status = run_llm_with_budget(_llm, _llm_pool, explain, citizen, budget_ms=1500)
+"""
+
+from concurrent.futures import Executor, TimeoutError as FutureTimeout
+
+
+def run_llm_with_budget(llm, pool: Executor, fn, *args, budget_ms: int | None = None) -> tuple:
+    """
+    Run `fn(*args)` on `pool` without letting it hold up the response; `llm`
+    is the agent's LLM client, None when none is configured.
+
+    Returns `(result, status)`; status is "ok", "unavailable" (no LLM or empty
+    answer), "skipped" (no budget left to start) or "dropped" (missed the
+    budget — the answer is discarded).
+    """
+    if not llm:
+        return None, "unavailable"
+    if budget_ms is not None and budget_ms <= 0:
+        return None, "skipped"
+    future = pool.submit(fn, *args)
+    try:
+        result = future.result(timeout=None if budget_ms is None else budget_ms / 1000)
+    except FutureTimeout:
+        future.cancel()
+        return None, "dropped"
+    return result, "ok" if result else "unavailable"
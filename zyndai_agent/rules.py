@@ -0,0 +1,270 @@
+"""
+zyndai_agent/rules.py
+=====================
+Scheme eligibility rules: the compiler and the `where` condition language,
+shared by the Policy Agent (which compiles every scheme once per catalog
+version and ships the result as `compiled_rules`) and the Eligibility Agent
+(which evaluates it, and compiles schemes sent by value without it).
+
+Scheme `rules` are free-form JSON (the scraper's built-in dataset uses
+min_age / max_income, others age_min / income_max, plus many descriptive
+keys). Bump RULES_COMPILER_VERSION whenever the compiled form changes.
+
+Conditions on other citizen fields go in `where`, a small rule language:
+  {"all": [...]}, {"any": [...]}, {"not": {...}}                 combinators
+  {"field": "state", "in": ["bihar", "assam"]}                   set membership
+  {"field": "land_ha", "min": 0, "max": 2}                       numeric range
+  {"field": "bpl", "is": true}                                   flag
+  {"field": "documents", "has": ["aadhaar", "bank_account"]}     list contains all
+  {"field": "gender", "eq": "female"}                            same as "in": [...]
+A condition on a field the citizen did not give counts as met, unless the
+node says "if_missing": false; a `not` above it does not change that. The
+keys in RULE_SHORTHANDS are sugar for common conditions; all of them and
+`where` must hold together.
+"""
+
+import json
+
+RULES_COMPILER_VERSION = 2
+RULE_DEFAULTS = {"age_min": 0, "age_max": 120, "income_max": 10000000}
+RULE_ALIASES  = {"min_age": "age_min", "max_age": "age_max", "max_income": "income_max"}
+RULE_SHORTHANDS = {
+    "states":             lambda v: {"field": "state", "in": v},
+    "gender":             lambda v: {"field": "gender", "in": v},
+    "max_land_ha":        lambda v: {"field": "land_ha", "max": v},
+    "min_disability_pct": lambda v: {"field": "disability_pct", "min": v},
+    "documents":          lambda v: {"field": "documents", "has": v},
+}
+
+
+def condition_text(value) -> str:
+    """How condition values and citizen values are compared as text."""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip().lower()
+
+
+def normalize_condition(node, path: str, errors: list) -> dict | None:
+    """Canonical form of one `where` node, or None (with an error) if it cannot be used."""
+    if not isinstance(node, dict):
+        errors.append(f"{path}: expected an object ({node!r})")
+        return None
+    for op in ("all", "any"):
+        if op in node:
+            if not isinstance(node[op], list) or not node[op]:
+                errors.append(f"{path}.{op}: expected a non-empty list")
+                return None
+            args = [normalize_condition(c, f"{path}.{op}[{i}]", errors) for i, c in enumerate(node[op])]
+            args = [a for a in args if a is not None]
+            if not args:
+                return None
+            return args[0] if len(args) == 1 else {op: args}
+    if "not" in node:
+        arg = normalize_condition(node["not"], f"{path}.not", errors)
+        return {"not": arg} if arg is not None else None
+
+    field = node.get("field")
+    if not isinstance(field, str) or not field.strip():
+        errors.append(f"{path}: condition without a field ({node!r})")
+        return None
+    out = {"field": field.strip().lower()}
+    if "eq" in node:
+        node = {**node, **({"is": node["eq"]} if isinstance(node["eq"], bool) else {"in": [node["eq"]]})}
+    if "in" in node or "has" in node:
+        op = "in" if "in" in node else "has"
+        values = [node[op]] if isinstance(node[op], (str, int, float)) else node[op]
+        if not isinstance(values, list) or not values or \
+                not all(isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in values):
+            errors.append(f"{path}.{op}: expected a value or a list of values ({node[op]!r})")
+            return None
+        out[op] = sorted({condition_text(v) for v in values})
+    elif "is" in node:
+        if not isinstance(node["is"], bool):
+            errors.append(f"{path}.is: expected true or false ({node['is']!r})")
+            return None
+        out["is"] = node["is"]
+    elif "min" in node or "max" in node:
+        for bound in ("min", "max"):
+            if bound in node:
+                try:
+                    number = float(node[bound])
+                except (TypeError, ValueError):
+                    errors.append(f"{path}.{bound}: not a number ({node[bound]!r})")
+                    return None
+                out[bound] = int(number) if number.is_integer() else number
+        if out.get("min", float("-inf")) > out.get("max", float("inf")):
+            errors.append(f"{path}: min {out['min']} > max {out['max']}")
+            return None
+    else:
+        errors.append(f"{path}: no operator (in, has, is, eq, min, max) in {node!r}")
+        return None
+    if node.get("if_missing") is False:
+        out["if_missing"] = False
+    return out
+
+
+def compile_rules(rules) -> dict:
+    """
+    Normalized rules: numeric bounds with defaults filled in, lowercased
+    category list, the other conditions as one canonical `where` tree (None
+    if there are none), plus the keys the rule engine does not evaluate
+    (`ignored`) and values it could not use (`errors`).
+    """
+    if isinstance(rules, str):
+        try:
+            rules = json.loads(rules)
+        except Exception:
+            rules = {}
+    if not isinstance(rules, dict):
+        rules = {}
+    compiled = dict(RULE_DEFAULTS)
+    categories, ignored, errors, conditions = ["general"], [], [], []
+    for key, value in rules.items():
+        target = RULE_ALIASES.get(key, key)
+        if target != key and target in rules:
+            ignored.append(key)  # the canonical key wins over its alias
+        elif key in RULE_SHORTHANDS:
+            conditions.append(normalize_condition(RULE_SHORTHANDS[key](value), key, errors))
+        elif key == "where":
+            conditions.append(normalize_condition(value, key, errors))
+        elif target in RULE_DEFAULTS:
+            try:
+                number = float(value)
+                compiled[target] = int(number) if number.is_integer() else number
+            except (TypeError, ValueError):
+                errors.append(f"{key}: not a number ({value!r})")
+        elif key == "categories":
+            values = [value] if isinstance(value, str) else value
+            if isinstance(values, list) and all(isinstance(c, str) for c in values):
+                categories = sorted({c.strip().lower() for c in values if c.strip()})
+            else:
+                errors.append(f"categories: expected a list of strings ({value!r})")
+        else:
+            ignored.append(key)
+    if compiled["age_min"] > compiled["age_max"]:
+        errors.append(f"age_min {compiled['age_min']} > age_max {compiled['age_max']}")
+    conditions = [c for c in conditions if c is not None]
+    where = conditions[0] if len(conditions) == 1 else ({"all": conditions} if conditions else None)
+    compiled.update(v=RULES_COMPILER_VERSION, categories=categories, open="general" in categories,
+                    where=where, ignored=sorted(ignored), errors=errors)
+    return compiled
+
+
+def with_compiled_rules(scheme: dict) -> dict:
+    """`scheme` with `compiled_rules` from the current compiler, compiling them if missing or stale."""
+    compiled = scheme.get("compiled_rules")
+    if isinstance(compiled, dict) and compiled.get("v") == RULES_COMPILER_VERSION:
+        return scheme
+    return {**scheme, "compiled_rules": compile_rules(scheme.get("rules", {}))}
+
+
+# ── Condition predicates ─────────────────────────────────────────────────────
+# A compiled `where` tree becomes closures over the citizen dict. all / any
+# nodes count how often each child passes and every REORDER_EVERY calls sort
+# their children so the cheapest, most decisive checks run first and
+# short-circuit the rest.
+REORDER_EVERY = 64
+FLAG_WORDS = {"true", "yes", "y", "1"}
+
+
+class Junction:
+    """An all / any node whose children are reordered by observed selectivity."""
+    __slots__ = ("conjunctive", "children", "cost", "calls")
+
+    def __init__(self, conjunctive: bool, children: list):
+        self.conjunctive = conjunctive
+        self.children = [[fn, cost, 0, 0] for fn, cost in children]  # predicate, cost, calls, passes
+        self.cost = sum(cost for _, cost in children)
+        self.calls = 0
+
+    def __call__(self, citizen: dict) -> bool:
+        self.calls += 1
+        if self.calls % REORDER_EVERY == 0:
+            self.reorder()
+        for child in self.children:
+            child[2] += 1
+            if child[0](citizen):
+                child[3] += 1
+                if not self.conjunctive:
+                    return True
+            elif self.conjunctive:
+                return False
+        return self.conjunctive
+
+    def reorder(self):
+        # Expected cost until the answer is known: `all` stops at the first
+        # failure, `any` at the first pass. Rates are smoothed so a child that
+        # has not run yet still gets a turn.
+        def rank(child):
+            passing = (child[3] + 1) / (child[2] + 2)
+            return child[1] / ((1 - passing) if self.conjunctive else passing)
+        self.children = sorted(self.children, key=rank)
+
+
+def condition_predicate(node: dict, negate: bool = False) -> tuple:
+    """
+    (predicate over a citizen dict, relative cost) for a compiled `where` node.
+    `not` is pushed down to the field comparisons (all / any swap places), so
+    a missing field still gives its `if_missing` result under a `not`.
+    """
+    if "all" in node or "any" in node:
+        children = [condition_predicate(c, negate) for c in node.get("all") or node["any"]]
+        junction = Junction(("all" in node) != negate, children)
+        return junction, junction.cost
+    if "not" in node:
+        return condition_predicate(node["not"], not negate)
+
+    if "in" in node:
+        values = frozenset(node["in"])
+        test, cost = (lambda v: condition_text(v) in values), 1
+    elif "has" in node:
+        required = frozenset(node["has"])
+        test, cost = (lambda v: required <= {condition_text(x) for x in (v.split(",") if isinstance(v, str) else v)}), 3
+    elif "is" in node:
+        want = node["is"]
+        test, cost = (lambda v: (v if isinstance(v, bool) else condition_text(v) in FLAG_WORDS) == want), 1
+    else:
+        low, high = node.get("min", float("-inf")), node.get("max", float("inf"))
+        test, cost = (lambda v: low <= float(v) <= high), 1
+
+    field, if_missing = node["field"], node.get("if_missing", True)
+
+    def predicate(citizen: dict) -> bool:
+        value = citizen.get(field)
+        if value is None or value == "":
+            return if_missing
+        try:
+            return test(value) != negate
+        except (TypeError, ValueError):
+            return False
+    return predicate, cost
+
+
+def describe_condition(node: dict, nested: bool = False) -> str:
+    """Human-readable form of a compiled `where` node, for reason strings."""
+    for op in ("all", "any"):
+        if op in node:
+            text = f" {'and' if op == 'all' else 'or'} ".join(describe_condition(c, True) for c in node[op])
+            return f"({text})" if nested else text
+    if "not" in node:
+        return f"not {describe_condition(node['not'], True)}"
+    field = node["field"]
+    if "in" in node:
+        return f"{field} is {node['in'][0]}" if len(node["in"]) == 1 else f"{field} in {', '.join(node['in'])}"
+    if "has" in node:
+        return f"{field} include {', '.join(node['has'])}"
+    if "is" in node:
+        return f"{field} is {'yes' if node['is'] else 'no'}"
+    if "min" in node and "max" in node:
+        return f"{field} between {node['min']} and {node['max']}"
+    return f"{field} at least {node['min']}" if "min" in node else f"{field} at most {node['max']}"
+
+
+def condition_fields(node: dict) -> set:
+    """Citizen fields a compiled `where` node reads."""
+    for op in ("all", "any"):
+        if op in node:
+            return set().union(*(condition_fields(c) for c in node[op]))
+    if "not" in node:
+        return condition_fields(node["not"])
+    return {node["field"]}